@@ -0,0 +1,418 @@
+# Content-addressed, deduplicating storage for uploaded test artifacts.
+#
+# Consecutive revisions of the DejaGnu .sum and .log files are mostly
+# identical, so instead of keeping one full copy per revision, files
+# are split into content-defined chunks which are stored once in a
+# shared pool, keyed by their SHA-256.  Each stored file is then
+# described by a small manifest listing its chunks, so disk usage
+# grows with the amount of change rather than with the number of
+# revisions.
+#
+# Layout of the store:
+# <root>/chunks/<hh>/<sha256>                       xz compressed chunk
+# <root>/manifests/<builder>/<branch>/r<rev>/<name>  JSON manifest
+# <root>/archive/<builder>/<branch>/<YYYY-MM>.tar    packed old manifests
+# <root>/archive/<builder>/<branch>/<YYYY-MM>.idx    JSON index of the above
+# <root>/retention.json                             progress of lib/retention.py
+#
+# Manifests of old revisions are packed into per-month archives (see
+# lib/retention.py).  The index of each archive maps 'r<rev>/<name>'
+# to the offset and size of the manifest in the tar file, so that it
+# can be read without scanning the archive.
+#
+# Chunk boundaries are only placed at the end of a line and are chosen
+# by a rolling hash over the last few lines, so that an insertion or a
+# deletion in a file only changes the chunks around it.  Each chunk is
+# compressed on its own, which keeps any chunk of any file readable
+# without decompressing the rest of it.
+
+import hashlib
+import io
+import json
+import lzma
+import os
+import re
+import tarfile
+import tempfile
+import time
+import zlib
+
+MANIFEST_VERSION = 1
+
+# Number of lines considered by the rolling hash
+WINDOW = 4
+# A chunk ends after a line when the rolling hash has these bits clear,
+# i.e. on average every 256 lines...
+BOUNDARY_MASK = 0xff
+# ...but chunks are never smaller or (unless a line is too long) bigger than:
+MIN_CHUNK_SIZE = 8 * 1024
+MAX_CHUNK_SIZE = 256 * 1024
+
+REVISION_RE = re.compile(r'r(\d+)$')
+ARCHIVE_INDEX_SUFFIX = '.idx'
+
+
+def chunk_stream(stream):
+    """Splits the binary stream into content-defined chunks, yielding bytes."""
+    window = [0] * WINDOW
+    rolling = 0
+    chunk = []
+    size = 0
+
+    for idx, line in enumerate(stream):
+        # Rolling hash: sum of the hashes of the last WINDOW lines
+        h = zlib.crc32(line)
+        rolling = (rolling - window[idx % WINDOW] + h) & 0xffffffff
+        window[idx % WINDOW] = h
+
+        while len(line) > MAX_CHUNK_SIZE - size:
+            cut = MAX_CHUNK_SIZE - size
+            chunk.append(line[:cut])
+            yield b''.join(chunk)
+            chunk, size = [], 0
+            line = line[cut:]
+
+        chunk.append(line)
+        size += len(line)
+
+        if size >= MIN_CHUNK_SIZE and (rolling & BOUNDARY_MASK) == 0:
+            yield b''.join(chunk)
+            chunk, size = [], 0
+
+    if chunk:
+        yield b''.join(chunk)
+
+
+def write_atomically(path, data):
+    """Writes data to path, so that readers never see a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp, 0o664)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class ArtifactReader(io.RawIOBase):
+    """
+    Streams the content of a stored file, decompressing one chunk at a time.
+    """
+    def __init__(self, store, manifest):
+        super().__init__()
+        self.store = store
+        self.chunks = iter(manifest['chunks'])
+        self.buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.buffer:
+            try:
+                digest, _ = next(self.chunks)
+            except StopIteration:
+                return 0
+            self.buffer = self.store.read_chunk(digest)
+
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        self.buffer = self.buffer[n:]
+        return n
+
+
+class ArtifactStore:
+    """
+    A chunked, content-addressed store of test artifacts.
+
+    Files are identified by builder, branch, revision and name
+    (e.g. 'gcc.sum' or 'g++.log').
+    """
+    def __init__(self, root):
+        self.root = root
+        self.chunkdir = os.path.join(root, 'chunks')
+        self.manifestdir = os.path.join(root, 'manifests')
+        self.archivedir = os.path.join(root, 'archive')
+        # Bytes of manifests and archive indexes read, for the budget of
+        # the retention policy
+        self.metadata_read = 0
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunkdir, digest[:2], digest)
+
+    def manifest_path(self, builder, branch, rev, name):
+        return os.path.join(self.manifestdir, builder, branch,
+                            'r{}'.format(rev), name)
+
+    def read_chunk(self, digest):
+        with open(self.chunk_path(digest), 'rb') as f:
+            return lzma.decompress(f.read())
+
+    def write_chunk(self, data):
+        """Stores data in the chunk pool, unless already there, and returns its digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+        try:
+            # Refresh the chunk so that a concurrent gc() keeps it
+            os.utime(path)
+        except FileNotFoundError:
+            write_atomically(path, lzma.compress(data))
+        return digest
+
+    def put(self, builder, branch, rev, name, stream):
+        """Stores the binary stream as file name of the given revision.
+
+        Returns the manifest describing the file."""
+        chunks = []
+        size = 0
+        for data in chunk_stream(stream):
+            chunks.append([self.write_chunk(data), len(data)])
+            size += len(data)
+
+        manifest = {'version': MANIFEST_VERSION,
+                    'size': size,
+                    'stored': time.time(),
+                    'chunks': chunks}
+        write_atomically(self.manifest_path(builder, branch, rev, name),
+                          json.dumps(manifest).encode('utf-8'))
+        return manifest
+
+    def archive_indexes(self, builder, branch):
+        """Yields (tar path, index) for every archive of builder and branch."""
+        path = os.path.join(self.archivedir, builder, branch)
+        if not os.path.isdir(path):
+            return
+        for f in sorted(os.listdir(path)):
+            if not f.endswith(ARCHIVE_INDEX_SUFFIX):
+                continue
+            with open(os.path.join(path, f), 'rb') as idx:
+                data = idx.read()
+            self.metadata_read += len(data)
+            index = json.loads(data.decode('utf-8'))
+            yield os.path.join(path, f[:-len(ARCHIVE_INDEX_SUFFIX)] + '.tar'), index
+
+    def archived_manifest(self, builder, branch, rev, name):
+        """Returns the manifest of a file from the archives, or None."""
+        key = 'r{}/{}'.format(rev, name)
+        for tarpath, index in self.archive_indexes(builder, branch):
+            if key in index:
+                offset, size = index[key]
+                with open(tarpath, 'rb') as f:
+                    f.seek(offset)
+                    self.metadata_read += size
+                    return json.loads(f.read(size).decode('utf-8'))
+        return None
+
+    def manifest(self, builder, branch, rev, name):
+        """Returns the manifest of a stored file, or raises FileNotFoundError."""
+        try:
+            with open(self.manifest_path(builder, branch, rev, name), 'rb') as f:
+                data = f.read()
+            self.metadata_read += len(data)
+            return json.loads(data.decode('utf-8'))
+        except FileNotFoundError:
+            manifest = self.archived_manifest(builder, branch, rev, name)
+            if manifest is None:
+                raise
+            return manifest
+
+    def content_hash(self, builder, branch, rev, name):
+        """Returns a digest of the content of a stored file, computed from
+        its chunk digests without reading it."""
+        manifest = self.manifest(builder, branch, rev, name)
+        return hashlib.sha256(''.join(digest for digest, _ in manifest['chunks'])
+                              .encode('ascii')).hexdigest()
+
+    def exists(self, builder, branch, rev, name):
+        return os.path.exists(self.manifest_path(builder, branch, rev, name)) \
+            or self.archived_manifest(builder, branch, rev, name) is not None
+
+    def open(self, builder, branch, rev, name, mode='rb'):
+        """Opens a stored file for streaming, either in 'rb' or 'r' mode."""
+        reader = io.BufferedReader(ArtifactReader(self, self.manifest(builder, branch,
+                                                                      rev, name)))
+        if mode == 'r':
+            return io.TextIOWrapper(reader, encoding='utf-8', errors='replace')
+        return reader
+
+    def revisions(self, builder, branch, name=None):
+        """Returns the sorted list of revisions stored for builder and branch.
+
+        If name is given, only revisions containing that file are returned."""
+        revisions = set()
+
+        path = os.path.join(self.manifestdir, builder, branch)
+        if os.path.isdir(path):
+            for entry in os.listdir(path):
+                m = REVISION_RE.match(entry)
+                if not m:
+                    continue
+                if name and not os.path.exists(os.path.join(path, entry, name)):
+                    continue
+                revisions.add(int(m.group(1)))
+
+        for _, index in self.archive_indexes(builder, branch):
+            for key in index:
+                entry, filename = key.split('/', 1)
+                if not name or filename == name:
+                    revisions.add(int(entry[1:]))
+
+        return sorted(revisions)
+
+    def loose_revisions(self, builder, branch):
+        """Returns the sorted list of revisions not packed in an archive yet."""
+        path = os.path.join(self.manifestdir, builder, branch)
+        if not os.path.isdir(path):
+            return []
+        return sorted(int(m.group(1)) for m in map(REVISION_RE.match, os.listdir(path)) if m)
+
+    def series(self):
+        """Returns the sorted list of (builder, branch) with stored files."""
+        series = set()
+        for dirpath, dirnames, _ in os.walk(self.manifestdir):
+            if any(REVISION_RE.match(d) for d in dirnames):
+                builder, _, branch = os.path.relpath(dirpath, self.manifestdir).partition(os.sep)
+                series.add((builder, branch))
+                # Do not descend into revisions
+                dirnames[:] = [d for d in dirnames if not REVISION_RE.match(d)]
+        for dirpath, _, filenames in os.walk(self.archivedir):
+            if any(f.endswith(ARCHIVE_INDEX_SUFFIX) for f in filenames):
+                builder, _, branch = os.path.relpath(dirpath, self.archivedir).partition(os.sep)
+                series.add((builder, branch))
+        return sorted(series)
+
+    def files(self, builder, branch, rev):
+        """Returns the names of the files stored for a revision."""
+        names = set()
+        path = os.path.join(self.manifestdir, builder, branch, 'r{}'.format(rev))
+        if os.path.isdir(path):
+            names.update(f for f in os.listdir(path) if not f.startswith('.'))
+
+        prefix = 'r{}/'.format(rev)
+        for _, index in self.archive_indexes(builder, branch):
+            names.update(key[len(prefix):] for key in index if key.startswith(prefix))
+
+        return sorted(names)
+
+    def stored_time(self, builder, branch, rev):
+        """Returns when the first of the loose files of a revision was
+        stored, or None if it has none.
+
+        Unlike the modification time of the revision directory, it does
+        not change when files are added to or removed from the revision
+        afterwards."""
+        path = os.path.join(self.manifestdir, builder, branch, 'r{}'.format(rev))
+        times = []
+        for f in self.loose_files(builder, branch, rev):
+            with open(os.path.join(path, f), 'rb') as mf:
+                data = mf.read()
+            self.metadata_read += len(data)
+            stored = json.loads(data.decode('utf-8')).get('stored')
+            # Manifests written before the time was recorded
+            times.append(stored if stored is not None else os.path.getmtime(os.path.join(path, f)))
+        return min(times) if times else None
+
+    def loose_files(self, builder, branch, rev):
+        """Returns the names of the files of a revision not packed in an
+        archive yet, without reading the archives."""
+        path = os.path.join(self.manifestdir, builder, branch, 'r{}'.format(rev))
+        if not os.path.isdir(path):
+            return []
+        return sorted(f for f in os.listdir(path) if not f.startswith('.'))
+
+    def remove(self, builder, branch, rev, name):
+        """Removes a file.  Its chunks are reclaimed by the next gc().
+
+        Files packed in an archive cannot be removed."""
+        os.remove(self.manifest_path(builder, branch, rev, name))
+
+    def archive(self, builder, branch, revisions, month):
+        """Packs the manifests of revisions into the archive of month
+        (YYYY-MM), in a single write of the archive.
+
+        Returns the number of bytes written."""
+        tarpath = os.path.join(self.archivedir, builder, branch, month + '.tar')
+        idxpath = tarpath[:-len('.tar')] + ARCHIVE_INDEX_SUFFIX
+        os.makedirs(os.path.dirname(tarpath), exist_ok=True)
+
+        index = {}
+        if os.path.exists(idxpath):
+            with open(idxpath, 'rb') as f:
+                data = f.read()
+            self.metadata_read += len(data)
+            index = json.loads(data.decode('utf-8'))
+
+        written = 0
+        packed = []
+        # Opening the archive for appending reads it through to its end,
+        # so it is only opened once for all the revisions
+        with tarfile.open(tarpath, 'a') as tar:
+            for rev in revisions:
+                revdir = os.path.join(self.manifestdir, builder, branch, 'r{}'.format(rev))
+                names = self.loose_files(builder, branch, rev)
+                for name in names:
+                    info = tar.gettarinfo(os.path.join(revdir, name),
+                                          arcname='r{}/{}'.format(rev, name))
+                    with open(os.path.join(revdir, name), 'rb') as f:
+                        tar.addfile(info, f)
+                    # The data was just written, padded to a whole number of blocks
+                    blocks = (info.size + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE
+                    index[info.name] = [tar.offset - blocks * tarfile.BLOCKSIZE, info.size]
+                    written += info.size
+                packed.append((revdir, names))
+
+        # The index is only updated once the archive holds the manifests,
+        # and the loose manifests only removed once the index is updated.
+        write_atomically(idxpath, json.dumps(index, sort_keys=True).encode('utf-8'))
+        for revdir, names in packed:
+            for name in names:
+                os.remove(os.path.join(revdir, name))
+            os.rmdir(revdir)
+
+        return written
+
+    def manifests(self):
+        """Yields every manifest in the store, loose or archived."""
+        for dirpath, _, filenames in os.walk(self.manifestdir):
+            for f in filenames:
+                if not f.startswith('.'):
+                    with open(os.path.join(dirpath, f)) as mf:
+                        yield json.load(mf)
+
+        for dirpath, _, filenames in os.walk(self.archivedir):
+            for f in filenames:
+                if f.endswith('.tar'):
+                    with tarfile.open(os.path.join(dirpath, f)) as tar:
+                        for member in tar:
+                            if member.isfile():
+                                yield json.loads(tar.extractfile(member).read().decode('utf-8'))
+
+    def referenced_chunks(self):
+        """Returns the set of digests referenced by some manifest."""
+        referenced = set()
+        for manifest in self.manifests():
+            referenced.update(digest for digest, _ in manifest['chunks'])
+        return referenced
+
+    def gc(self, grace=3600):
+        """Removes the chunks no longer referenced by any manifest.
+
+        Chunks younger than grace seconds are kept, since they may
+        belong to a file being stored whose manifest is not written yet.
+        Returns the number of bytes freed."""
+        referenced = self.referenced_chunks()
+        limit = time.time() - grace
+        freed = 0
+        for dirpath, _, filenames in os.walk(self.chunkdir):
+            for f in filenames:
+                if f in referenced or f.startswith('.'):
+                    continue
+                path = os.path.join(dirpath, f)
+                if os.path.getmtime(path) > limit:
+                    continue
+                freed += os.path.getsize(path)
+                os.remove(path)
+        return freed
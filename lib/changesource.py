@@ -0,0 +1,48 @@
+# Incremental SVN change source.
+#
+# The stock SVNPoller runs 'svn log --limit=<histmax>' over the whole
+# repository at every poll, and forgets the last seen revision when the
+# master restarts.  IncrementalSVNPoller persists the last seen revision
+# in the buildbot database and only asks for the revisions since then.
+#
+# Polling is only a fallback: the SVN post-commit hook (see
+# scripts/svn-post-commit) notifies the master through the 'poller'
+# change hook of the web server, which polls immediately.
+
+from buildbot.changes.svnpoller import SVNPoller
+from buildbot.util.state import StateMixin
+from twisted.internet import defer
+
+
+class IncrementalSVNPoller(SVNPoller, StateMixin):
+    """SVNPoller asking only for the revisions since the last seen one."""
+
+    @defer.inlineCallbacks
+    def activate(self):
+        # Changes committed while the master was down are reported at
+        # the first poll
+        self.last_change = yield self.getState('last_change', None)
+        yield defer.maybeDeferred(super().activate)
+
+    def getLogs(self, _):
+        if self.last_change is None:
+            return super().getLogs(_)
+
+        # The last seen revision is asked for too, so that the log is
+        # never empty and SVNPoller knows where the new changes start
+        args = ['log', '--xml', '--verbose', '--non-interactive',
+                '--revision', 'HEAD:{}'.format(self.last_change)]
+        if self.svnuser:
+            args.append('--username={}'.format(self.svnuser))
+        if self.svnpasswd is not None:
+            args.append('--password={}'.format(self.svnpasswd))
+        if self.extra_args:
+            args.extend(self.extra_args)
+        args.extend(['--limit={}'.format(self.histmax), self.svnurl])
+        return self.getProcessOutput(args)
+
+    @defer.inlineCallbacks
+    def poll(self):
+        yield super().poll()
+        if self.last_change is not None:
+            yield self.setState('last_change', self.last_change)
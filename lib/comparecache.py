@@ -0,0 +1,124 @@
+# Memoized comparisons of test results.
+#
+# The same pair of result sets is often compared several times:
+# rebuilds of a revision, notifications, try builds against the same
+# base revision.  The cache maps a key made of the content hashes of
+# both result sets (see ArtifactStore.content_hash) and of the way they
+# are compared, to the result of the comparison, so that comparing
+# again is a single file read.
+#
+# Entries are JSON files, <root>/<hh>/<key>.json.  Their modification
+# time records their last use; the least recently used entries are
+# evicted when the cache grows over max_size bytes.  Hits and misses
+# are counted in <root>/stats.json.
+
+import fcntl
+import hashlib
+import json
+import os
+
+from lib.artifactstore import write_atomically
+
+# Bump when the format of cached results changes
+CACHE_VERSION = 2
+
+STATS_FILE = 'stats.json'
+
+
+def comparison_key(method, before, after):
+    """Returns the cache key of the comparison of the content hashes
+    before and after with method (e.g. 'jv')."""
+    return hashlib.sha256('{}\0{}\0{}\0{}'.format(CACHE_VERSION, method, before, after)
+                          .encode('utf-8')).hexdigest()
+
+
+class CompareCache:
+    """
+    On-disk LRU cache of comparison results.
+    """
+    def __init__(self, root, max_size=256 * 1024 * 1024):
+        self.root = root
+        self.max_size = max_size
+
+    def entry_path(self, key):
+        return os.path.join(self.root, key[:2], '{}.json'.format(key))
+
+    def get(self, key):
+        """Returns the cached result of key, or None."""
+        path = self.entry_path(key)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            self.count('misses')
+            return None
+        self.count('hits')
+        return result
+
+    def put(self, key, result):
+        write_atomically(self.entry_path(key), json.dumps(result).encode('utf-8'))
+        self.evict()
+
+    def entries(self):
+        """Yields (mtime, size, path) for every entry."""
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith('.json') and name != STATS_FILE:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield st.st_mtime, st.st_size, path
+
+    def evict(self):
+        """Removes the least recently used entries over max_size.
+
+        Returns the number of entries removed."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def count(self, counter):
+        """Increments a counter of the statistics."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, STATS_FILE), 'a+') as f:
+            # Analyses run concurrently
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                stats = json.loads(f.read())
+            except ValueError:
+                stats = {}
+            stats[counter] = stats.get(counter, 0) + 1
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(stats))
+
+    def stats(self):
+        """Returns the hit and miss counts, the hit rate and the size of the cache."""
+        try:
+            with open(os.path.join(self.root, STATS_FILE)) as f:
+                stats = json.load(f)
+        except (FileNotFoundError, ValueError):
+            stats = {}
+
+        hits = stats.get('hits', 0)
+        misses = stats.get('misses', 0)
+        entries = list(self.entries())
+        return {'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+                'entries': len(entries),
+                'size': sum(size for _, size, _ in entries)}
@@ -0,0 +1,125 @@
+# Cross-architecture analysis of the regressions of a revision.
+#
+# The results of every architecture (builder) for the same revision,
+# and for the revision each of them was compared against, are loaded
+# into two test x architecture outcome matrices over interned test
+# ids.  A single vectorized pass then tells, for each regressed test,
+# whether it regressed on every architecture running it (generic), on
+# only one of them (arch-specific), or on some of them (partial).
+#
+# Outcomes are coded as small integers, 0 meaning that the
+# architecture does not run the test.
+
+from itertools import chain
+
+import numpy as np
+
+from lib.dejagnu import OUTCOMES, FAILING_OUTCOMES
+
+ABSENT = 0
+OUTCOME_CODES = {outcome: i + 1 for i, outcome in enumerate(OUTCOMES)}
+FAILING_CODES = np.array(sorted(OUTCOME_CODES[outcome] for outcome in FAILING_OUTCOMES),
+                         dtype=np.int8)
+
+
+def outcome_codes(results):
+    """Returns the array of the outcome codes of results, a dictionary
+    from test name to outcome."""
+    return np.fromiter(map(OUTCOME_CODES.__getitem__, results.values()), dtype=np.int8,
+                       count=len(results))
+
+
+class TestIndex:
+    """
+    Interned test ids, in first seen order.
+
+    The architectures usually run the same tests in the same order, in
+    which case the ids of their tests are found without hashing them.
+    """
+    def __init__(self):
+        self.testnames = []
+        self.index = None
+
+    def ids(self, testnames):
+        """Returns the array of the ids of testnames, interning the new ones."""
+        testnames = list(testnames)
+        known = len(self.testnames)
+        if testnames[:known] == self.testnames:
+            # The known tests, then new ones
+            self.intern(testnames[known:])
+            return np.arange(len(testnames), dtype=np.int64)
+        if testnames == self.testnames[:len(testnames)]:
+            return np.arange(len(testnames), dtype=np.int64)
+
+        if self.index is None:
+            self.index = dict(zip(self.testnames, range(known)))
+        self.intern([name for name in testnames if name not in self.index])
+        return np.fromiter(map(self.index.__getitem__, testnames), dtype=np.int64,
+                           count=len(testnames))
+
+    def intern(self, new):
+        """Gives ids to new, a list of test names not interned yet."""
+        if self.index is not None:
+            self.index.update(zip(new, range(len(self.testnames), len(self.testnames) + len(new))))
+        self.testnames.extend(new)
+
+
+class ResultMatrix:
+    """
+    Outcomes of the tests of several architectures, before and after a
+    revision.  before and after are dictionaries from architecture to
+    a dictionary from test name to outcome.
+    """
+    def __init__(self, before, after):
+        self.archs = sorted(after)
+        index = TestIndex()
+        columns = []
+        for results in chain((after[arch] for arch in self.archs),
+                             (before.get(arch, {}) for arch in self.archs)):
+            columns.append((index.ids(results.keys()), outcome_codes(results)))
+        self.testnames = index.testnames
+
+        shape = (len(self.testnames), len(self.archs))
+        self.after = np.zeros(shape, dtype=np.int8)
+        self.before = np.zeros(shape, dtype=np.int8)
+        for col, (ids, codes) in enumerate(columns):
+            matrix = self.after if col < len(self.archs) else self.before
+            matrix[ids, col % len(self.archs)] = codes
+
+    def regressions(self):
+        """Returns the boolean test x architecture matrix of regressions:
+        tests changing to a failing outcome."""
+        return np.isin(self.after, FAILING_CODES) & (self.after != self.before)
+
+    def classify(self):
+        """Returns the classification of the regressions, as a JSON
+        serializable dictionary:
+
+          generic: tests regressed on all the (two or more)
+                   architectures running them;
+          specific: for each architecture, the tests regressed only there;
+          partial: tests regressed on some of the architectures running
+                   them, with these architectures."""
+        regressed = self.regressions()
+        count = regressed.sum(axis=1)
+        present = (self.after != ABSENT).sum(axis=1)
+
+        generic = np.flatnonzero((count >= 2) & (count == present))
+        specific = np.flatnonzero(count == 1)
+        partial = np.flatnonzero((count >= 2) & (count < present))
+
+        specific_arch = regressed[specific].argmax(axis=1)
+        result = {'archs': self.archs,
+                  'generic': sorted(self.testnames[i] for i in generic),
+                  'specific': {arch: [] for arch in self.archs},
+                  'partial': []}
+        for i, col in zip(specific, specific_arch):
+            result['specific'][self.archs[col]].append(self.testnames[i])
+        for tests in result['specific'].values():
+            tests.sort()
+        for i in partial:
+            result['partial'].append({'test': self.testnames[i],
+                                      'archs': [self.archs[col]
+                                                for col in np.flatnonzero(regressed[i])]})
+        result['partial'].sort(key=lambda entry: entry['test'])
+        return result
@@ -19,8 +19,25 @@
 # https://github.com/davidmalcolm/jamais-vu/blob/master/jv
 #
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 
-OUTCOMES = 'FAIL PASS XFAIL KFAIL XPASS KPASS UNTESTED UNRESOLVED UNSUPPORTED'.split()
+# HANG is not a DejaGnu outcome: it is recorded by scripts/runtest-wrapper
+# for the drivers it killed after they stalled.
+OUTCOMES = 'FAIL PASS XFAIL KFAIL XPASS KPASS UNTESTED UNRESOLVED UNSUPPORTED HANG'.split()
+
+# Version of the format returned by DejaFile.to_results
+RESULTS_VERSION = 1
+
+# Version of the format returned by DejaFile.to_summary
+SUMMARY_VERSION = 1
+
+# Outcomes that are a regression when a test changes to them
+FAILING_OUTCOMES = {'FAIL', 'XPASS', 'UNRESOLVED', 'HANG'}
+
+# Start of the output of a DejaGnu driver, e.g.
+# 'Running /path/to/gcc/testsuite/gcc.dg/dg.exp ...'
+RUNNING_RE = re.compile(r'^Running (?:target \S+ )?(\S+\.exp) \.\.\.')
 
 
 ############################################################################
@@ -29,8 +46,11 @@ OUTCOMES = 'FAIL PASS XFAIL KFAIL XPASS KPASS UNTESTED UNRESOLVED UNSUPPORTED'.s
 class DejaFile:
     """
     Output from dejagnu, either a .log or a .sum file
+
+    The content is read from path, unless an iterable of lines is
+    given (e.g. a file streamed from the artifact store).
     """
-    def __init__(self, path):
+    def __init__(self, path, lines=None):
         self.path = path
 
         # Mapping from test name to outcome
@@ -46,17 +66,81 @@ class DejaFile:
         # Mapping from test name to line index
         self.testname_to_lineidx = {}
 
+        # Mapping from test name to the .exp driver running it, e.g. 'dg.exp'
+        self.testname_to_exp = {}
+        exp = None
+
+        if lines is None:
+            lines = open(self.path)
+
         # Parse the file and build the above dicts:
-        for idx, line in enumerate(open(self.path)):
+        for idx, line in enumerate(lines):
+            m = RUNNING_RE.match(line)
+            if m:
+                exp = os.path.basename(m.group(1))
+                continue
             for outcome in OUTCOMES:
                 prefix = '{}: '.format(outcome)
                 if line.startswith(prefix):
                     testname = line[len(prefix):].rstrip()
                     self.testname_to_outcome[testname] = outcome
                     self.testname_to_lineidx[testname] = idx
+                    if exp:
+                        self.testname_to_exp[testname] = exp
                     self.outcome_to_testnames[outcome].add(testname)
                     break  # OUTCOMES loop
 
+    def add_result(self, testname, outcome, exp=None):
+        """Records a result that is not in the file, e.g. a hang."""
+        previous = self.testname_to_outcome.get(testname)
+        if previous is not None:
+            self.outcome_to_testnames[previous].discard(testname)
+        self.testname_to_outcome[testname] = outcome
+        self.outcome_to_testnames[outcome].add(testname)
+        if exp:
+            self.testname_to_exp[testname] = exp
+
+    def exps(self):
+        """Returns the set of the .exp drivers which ran, '' standing for
+        the tests without one."""
+        return {self.testname_to_exp.get(testname, '') for testname in self.testname_to_outcome}
+
+    def to_results(self):
+        """Returns the compact, JSON serializable, parsed results."""
+        return {'version': RESULTS_VERSION,
+                'outcomes': {outcome: sorted(testnames)
+                             for outcome, testnames in self.outcome_to_testnames.items()
+                             if testnames}}
+
+    def to_summary(self):
+        """Returns the compact, JSON serializable, summary of the results
+        the workers upload: the outcome of every test and the outcome
+        counts, grouped by .exp driver ('' for tests without one)."""
+        exps = {}
+        for testname, outcome in self.testname_to_outcome.items():
+            exp = exps.setdefault(self.testname_to_exp.get(testname, ''),
+                                  {'counts': {}, 'tests': {}})
+            exp['tests'][testname] = outcome
+            exp['counts'][outcome] = exp['counts'].get(outcome, 0) + 1
+        return {'version': SUMMARY_VERSION, 'exps': exps}
+
+    @classmethod
+    def from_summary(cls, path, summary):
+        """Returns the file described by summary (see to_summary), without
+        parsing it.  Line indexes are not known, so find() cannot be used."""
+        if summary.get('version') != SUMMARY_VERSION:
+            raise ValueError('Unsupported summary version {} of {}'
+                             .format(summary.get('version'), path))
+
+        result = cls(path, lines=[])
+        for exp, data in summary['exps'].items():
+            for testname, outcome in data['tests'].items():
+                result.testname_to_outcome[testname] = outcome
+                result.outcome_to_testnames[outcome].add(testname)
+                if exp:
+                    result.testname_to_exp[testname] = exp
+        return result
+
     def find(self, testname):
         if testname in self.testname_to_outcome:
             print('{}:{}: {}: {}'
@@ -73,8 +157,8 @@ class LogFile(DejaFile):
     """
     A .log file from dejagnu
     """
-    def __init__(self, path):
-        DejaFile.__init__(self, path)
+    def __init__(self, path, lines=None):
+        DejaFile.__init__(self, path, lines)
 
     def __repr__(self):
         return 'LogFile({})'.format(self.path)
@@ -84,8 +168,8 @@ class SumFile(DejaFile):
     """
     A .sum file from dejagnu
     """
-    def __init__(self, path):
-        DejaFile.__init__(self, path)
+    def __init__(self, path, lines=None):
+        DejaFile.__init__(self, path, lines)
 
         # Locate the .log file that this is a summary of:
         root, _ = os.path.splitext(path)
@@ -101,8 +185,8 @@ class SumFile(DejaFile):
     def __repr__(self):
         return 'SumFile({})'.format(self.path)
 
-    def __cmp__(self, other):
-        return cmp(self.path, other.path)
+    def __lt__(self, other):
+        return self.path < other.path
 
     def relative_path(self, basedir):
         return os.path.relpath(self.path, basedir)
@@ -126,27 +210,49 @@ class SumFile(DejaFile):
         tr.end_section()
 
 
+def find_sum_files(path):
+    """Returns the sorted paths of the .sum files below the directory path."""
+    result = []
+    for entry in os.scandir(path):
+        if entry.is_dir(follow_symlinks=False):
+            result.extend(find_sum_files(entry.path))
+        elif entry.name.endswith('.sum') and entry.is_file():
+            result.append(entry.path)
+    return sorted(result)
+
+
 class TestRun:
     """
     A collection of .sum files (and their .log files); either
     one or more individual ones, or a directory.
+
+    The .sum files are located when the run is created, but only parsed
+    when first needed, in jobs processes (as many as the CPUs by
+    default) when there are several of them.
     """
-    def __init__(self, path):
+    def __init__(self, path, jobs=None):
         self.path = path
-        self.sumfiles = []
+        self.jobs = jobs
         if os.path.isdir(path):
             # Locate within the directory structure:
-            def visit(_, dirname, names):
-                for name in sorted(names):
-                    if name.endswith('.sum'):
-                        sf = SumFile(os.path.join(dirname, name))
-                        self.sumfiles.append(sf)
-            os.path.walk(path, visit, None)
-        else:
+            self.sumpaths = find_sum_files(path)
+        elif path.endswith('.sum'):
             # Locate individual file:
-            if path.endswith('.sum'):
-                sf = SumFile(path)
-                self.sumfiles.append(sf)
+            self.sumpaths = [path]
+        else:
+            self.sumpaths = []
+        self._sumfiles = None
+
+    @property
+    def sumfiles(self):
+        if self._sumfiles is None:
+            jobs = min(self.jobs or os.cpu_count() or 1, len(self.sumpaths))
+            if jobs > 1:
+                with ProcessPoolExecutor(max_workers=jobs) as executor:
+                    self._sumfiles = list(executor.map(SumFile, self.sumpaths))
+            else:
+                self._sumfiles = [SumFile(path) for path in self.sumpaths]
+        return self._sumfiles
 
     def make_dict_by_rel_path(self):
         result = {}
@@ -179,6 +285,40 @@ class TestRun:
             sumfile.summarize(tr)
 
 
+def find_regressions(before, after):
+    """Returns the sorted list of tests of after that regressed from before.
+
+    Each element is a (testname, before outcome, after outcome) tuple,
+    the before outcome being None for new tests.  A test regresses when
+    its outcome changes to one of FAILING_OUTCOMES."""
+    regressions = []
+    for testname, outcome in after.testname_to_outcome.items():
+        previous = before.testname_to_outcome.get(testname)
+        if outcome in FAILING_OUTCOMES and outcome != previous:
+            regressions.append((testname, previous, outcome))
+    return sorted(regressions)
+
+
+def test_file(testname):
+    """Returns the source file of a test, e.g. 'pr123.c' for
+    'gcc.dg/pr123.c -O2 (test for excess errors)'."""
+    return os.path.basename(testname.split()[0])
+
+
+def runtestflags(tests):
+    """Returns RUNTESTFLAGS restricting runtest to the given tests.
+
+    tests is an iterable of (exp, testname) pairs, e.g.
+    [('dg.exp', 'gcc.dg/pr1.c (test for excess errors)')], giving
+    "dg.exp='pr1.c'".  Quotes are needed since the GCC makefiles pass
+    RUNTESTFLAGS to runtest through the shell."""
+    files_by_exp = {}
+    for exp, testname in tests:
+        files_by_exp.setdefault(exp, set()).add(test_file(testname))
+    return ' '.join("{}='{}'".format(exp, ' '.join(sorted(files)))
+                    for exp, files in sorted(files_by_exp.items()))
+
+
 ############################################################################
 # Various kinds of output
 ############################################################################
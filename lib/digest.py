@@ -0,0 +1,150 @@
+# Digest of the results of a revision on every architecture.
+#
+# Instead of one mail per build, the results of all the builders which
+# tested a revision are sent in a single mail (see DigestService in
+# lib/gccdigest.py): the regressions common to the architectures (see
+# lib/crossarch.py) are listed once, followed by a section per
+# architecture with its own results.  The digests ready at the same time
+# are sent through a single SMTP session.
+
+import smtplib
+from email.header import Header
+from email.mime.text import MIMEText
+
+
+def diff_section(regressions):
+    """Returns the part of a message showing the 'regressions' log of the
+    regression analysis, the diff to the previous build, which can be big."""
+    return ''.join(['*** Diff to previous build ***\n',
+                    '============================\n',
+                    regressions,
+                    '============================\n'])
+
+
+def format_regression(regression):
+    return '{} -> {}: {}\n'.format(regression['before'] or 'new', regression['after'],
+                                   regression['test'])
+
+
+def shared_section(crossarch):
+    """Returns the part of the digest listing the regressions of more than
+    one architecture, from the cross-architecture classification."""
+    text = ''
+    for lang, classification in sorted(crossarch.get('langs', {}).items()):
+        if not classification['generic'] and not classification['partial']:
+            continue
+        text += '{}:\n'.format(lang)
+        for test in classification['generic']:
+            text += '\tall architectures: {}\n'.format(test)
+        for entry in classification['partial']:
+            text += '\t{}: {}\n'.format(', '.join(entry['archs']), entry['test'])
+    if not text:
+        return ''
+    return ''.join(['*** Regressions on several architectures ***\n',
+                    '============================\n',
+                    text,
+                    '============================\n\n'])
+
+
+def shared_tests(crossarch, lang):
+    """Returns the tests of lang listed in the shared section."""
+    classification = crossarch.get('langs', {}).get(lang)
+    if not classification:
+        return set()
+    return (set(classification['generic'])
+            | {entry['test'] for entry in classification['partial']})
+
+
+def builder_section(build, crossarch):
+    """Returns the part of the digest about the build of one builder: its
+    result and the regressions not already listed in the shared section."""
+    text = '*** {} ***\n'.format(build['builder'])
+    text += 'Result: {}\n'.format(build['results'])
+    if build.get('url'):
+        text += 'Build: {}\n'.format(build['url'])
+    for lang, (previous, regressions) in sorted(build['regressions'].items()):
+        shared = shared_tests(crossarch, lang)
+        own = [r for r in regressions if r['test'] not in shared]
+        text += '\n{}: {} regressions since r{}'.format(lang, len(regressions), previous)
+        if len(own) < len(regressions):
+            text += ' ({} on several architectures, see above)'.format(len(regressions) - len(own))
+        text += '\n'
+        for regression in own:
+            text += '\t' + format_regression(regression)
+    slowdowns = build.get('slowdowns', {}).get('slowdowns')
+    if slowdowns:
+        text += '\nCompile-time slowdowns against r{} to r{}:\n'.format(*build['slowdowns']['baseline'])
+        for slowdown in slowdowns:
+            text += '\t{}: {} {:.3f} -> {:.3f} (+{:.1f}%, t = {:.1f})\n'.format(
+                slowdown['benchmark'], slowdown['metric'], slowdown['baseline'], slowdown['current'],
+                100.0 * (slowdown['current'] - slowdown['baseline']) / slowdown['baseline'],
+                slowdown['t'])
+    return text + '\n'
+
+
+def render_digest(branch, rev, change, builds, missing, crossarch, timeout):
+    """Returns the subject and the text of the digest of rev.
+
+    change is the change of the revision (with 'author' and 'comments'),
+    or None; builds the list of the finished builds of rev, as
+    dictionaries with the 'builder', 'results', 'url', 'regressions'
+    ({lang: (previous, [regression, ...])}, see
+    lib/gccbisect.load_regressions) and optionally 'slowdowns' (see
+    lib/gccdigest.load_slowdowns) keys; missing the builders which did
+    not finish within timeout seconds; crossarch the cross-architecture
+    classification of rev, or {}."""
+    title = change['comments'].split('\n')[0] if change else 'r{}'.format(rev)
+
+    text = '*** TEST RESULTS FOR COMMIT {} ***\n\n'.format(rev)
+    if change:
+        text += 'Author: {}\n'.format(change['author'])
+    text += 'Branch: {}\n'.format(branch)
+    text += 'Commit: {}\n\n'.format(rev)
+    if change:
+        text += change['comments'] + '\n\n'
+
+    regressed = [build['builder'] for build in builds
+                 if any(regressions for _, regressions in build['regressions'].values())
+                 or build.get('slowdowns', {}).get('slowdowns')]
+    text += 'Builders: {} finished'.format(len(builds))
+    if regressed:
+        text += ', {} with regressions'.format(len(regressed))
+    text += '\n'
+    if missing:
+        text += 'No results within {} minutes from: {}\n'.format(timeout // 60, ', '.join(sorted(missing)))
+    text += '\n'
+
+    text += shared_section(crossarch)
+    for build in sorted(builds, key=lambda build: build['builder']):
+        text += builder_section(build, crossarch)
+
+    if branch == 'trunk':
+        subject = '[gcc] {}'.format(title)
+    else:
+        subject = '[gcc/{}] {}'.format(branch, title)
+    if regressed:
+        subject += ' (regressions on {})'.format(', '.join(sorted(regressed)))
+    return subject, text
+
+
+def make_mail(subject, text, mail_from, mail_to, message_id):
+    # The commit logs are not always ASCII, e.g. the names of the authors
+    mail = MIMEText(text, 'plain', 'utf-8')
+    mail['Subject'] = Header(subject, 'utf-8')
+    mail['From'] = mail_from
+    mail['To'] = mail_to
+    mail['Message-Id'] = message_id
+    return mail
+
+
+def send_mails(mails, host='localhost'):
+    """Sends the mails through a single SMTP session."""
+    # Only sending needs prometheus_client, not composing the digests
+    from lib.metrics import SMTP_SEND_SECONDS
+    with SMTP_SEND_SECONDS.time():
+        s = smtplib.SMTP(host)
+        try:
+            for mail in mails:
+                s.sendmail(mail['From'], [mail['To']], mail.as_string())
+        finally:
+            s.quit()
@@ -0,0 +1,35 @@
+# Python class that calls script on the Master to store uploaded test
+# artifacts in the content-addressed artifact store
+
+import os
+from buildbot.plugins import util, steps
+
+# Where the artifact store lives on the master
+STORE_DIR = '/home/gcc-buildbot/data/store'
+
+class GCCIngestArtifacts(steps.MasterShellCommand):
+    """This simple step calls a script in master that moves an
+    uploaded tarball of .sum.xz/.log.xz files into the artifact store,
+    where they are deduplicated against previous revisions."""
+    name = 'Store test results'
+    description = 'Storing test results'
+    descriptionDone = 'Stored test results'
+
+    def __init__(self, tarball, storedir=STORE_DIR,
+                 builder=util.Property('buildername'),
+                 branch=util.Interpolate('%(src::branch:~trunk)s'),
+                 revision=util.Property('got_revision'),
+                 **kwargs):
+        """Simply initialize MasterShellCommand with the arguments to call the script.
+
+        The results are stored for the current build, unless builder,
+        branch and revision say otherwise."""
+        super().__init__(command=None, **kwargs)
+        self.command = [os.path.expanduser('~/gcc-buildbot/scripts/artifact-store.py'),
+                        'ingest',
+                        '--store', storedir,
+                        '--builder', builder,
+                        '--branch', branch,
+                        '--remove',
+                        revision,
+                        tarball]
@@ -0,0 +1,169 @@
+# Python class that bisects the regressions found by GCCRegressionAnalysis
+
+import json
+import os
+
+from buildbot.plugins import util, steps
+from buildbot.process.results import SUCCESS, WARNINGS, SKIPPED
+from twisted.internet import defer
+
+from lib.artifactstore import ArtifactStore
+from lib.dejagnu import SumFile, runtestflags
+from lib.gccartifacts import STORE_DIR
+
+# Where the .sum files of targeted test runs are uploaded on the master:
+# <TARGETED_DIR>/<builder>/<branch>/r<rev>/<lang>.sum
+TARGETED_DIR = '/home/gcc-buildbot/data/targeted'
+
+LANGS = ['gcc', 'g++', 'gfortran']
+
+
+def load_regressions(store, builder, branch, rev):
+    """Returns {lang: (previous, [regression, ...])} for the languages
+    of rev with regressions, as recorded by the regression analysis."""
+    found = {}
+    for lang in LANGS:
+        name = '{}.regressions.json'.format(lang)
+        if not store.exists(builder, branch, rev, name):
+            continue
+        with store.open(builder, branch, rev, name) as f:
+            data = json.loads(f.read().decode('utf-8'))
+        if data['regressions']:
+            found[lang] = (data['previous'], data['regressions'])
+    return found
+
+
+def can_target(regression):
+    """Returns whether regression can be re-run in isolation: its .exp
+    driver must be known, and it must not be a hang, which is only
+    detected by scripts/runtest-wrapper over a whole driver (and whose
+    test name is not a test of the driver)."""
+    return bool(regression['exp']) and regression['after'] != 'HANG'
+
+
+def start_bisection(store, builder, branch, rev):
+    """Returns the initial bisection state for the regressions of rev, or None.
+
+    Only the regressions which can be re-run in isolation (see
+    can_target) are bisected."""
+    found = {}
+    for lang, (previous, regressions) in load_regressions(store, builder, branch, rev).items():
+        regressions = [r for r in regressions if can_target(r)]
+        if regressions:
+            found[lang] = (previous, regressions)
+    if not found:
+        return None
+
+    return {'origin': rev,
+            'good': min(previous for previous, _ in found.values()),
+            'bad': rev,
+            'tests': {lang: regressions for lang, (_, regressions) in found.items()}}
+
+
+def targeted_tests(state):
+    """Returns the RUNTESTFLAGS of each language to re-run the regressed tests."""
+    return {lang: runtestflags((r['exp'], r['test']) for r in regressions)
+            for lang, regressions in state['tests'].items()}
+
+
+def classify(state, builder, branch, rev, targeteddir=TARGETED_DIR):
+    """Returns 'bad' if any regression of state shows up in the targeted
+    test results of rev, 'good' if none does, or None if rev could not
+    be tested (e.g. it failed to build)."""
+    for lang, regressions in sorted(state['tests'].items()):
+        path = os.path.join(targeteddir, builder, branch, 'r{}'.format(rev),
+                            '{}.sum'.format(lang))
+        if not os.path.exists(path):
+            return None
+
+        sumfile = SumFile(path)
+        for regression in regressions:
+            if sumfile.testname_to_outcome.get(regression['test']) == regression['after']:
+                return 'bad'
+    return 'good'
+
+
+def format_report(state, conclusion):
+    text = 'Bisection of the regressions of r{}\n\n'.format(state['origin'])
+    text += conclusion + '\n\n'
+    text += 'Regressed tests:\n'
+    for lang, regressions in sorted(state['tests'].items()):
+        for regression in regressions:
+            text += '\t{}: {} -> {}: {}\n'.format(lang, regression['before'],
+                                                  regression['after'], regression['test'])
+    return text
+
+
+class BisectGCCRegression(steps.Trigger):
+    """This step bisects the regressions found by GCCRegressionAnalysis
+    in the revisions between the previously tested revision and the
+    current one, none of which was built.
+
+    On a regular build with regressions it starts a bisection by
+    triggering, on the 'bisect-<builder>' scheduler, a build of the
+    revision halfway.  Bisection builds only re-run the regressed tests
+    (see the 'targeted_tests' property) in the warm incremental
+    builddir; this step then classifies their revision as good or bad
+    and triggers the next one, until the first bad revision is found."""
+    name = 'Bisect regression'
+    description = 'Bisecting regression'
+    descriptionDone = 'Bisected regression'
+
+    def __init__(self, storedir=STORE_DIR, targeteddir=TARGETED_DIR, **kwargs):
+        super().__init__(schedulerNames=[util.Interpolate('bisect-%(prop:buildername)s')],
+                         waitForFinish=False,
+                         **kwargs)
+        self.storedir = storedir
+        self.targeteddir = targeteddir
+        # Bisection is a best effort, it never fails the build
+        self.flunkOnFailure = False
+        self.warnOnFailure = True
+
+    @defer.inlineCallbacks
+    def run(self):
+        builder = self.getProperty('buildername')
+        branch = self.getProperty('branch') or 'trunk'
+        rev = int(self.getProperty('got_revision'))
+        state = self.getProperty('bisect')
+
+        if not state:
+            state = start_bisection(ArtifactStore(self.storedir), builder, branch, rev)
+            if state is None:
+                return SKIPPED
+        else:
+            # The revision requested may not have changed the branch, in
+            # which case the last revision of the branch before it was
+            # checked out (see scripts/gcc-checkout): rev, with the same
+            # sources as the requested one.
+            verdict = classify(state, builder, branch, rev, self.targeteddir)
+            if verdict is None:
+                yield self.addCompleteLog('bisection', format_report(
+                    state, 'r{} could not be tested, the first bad revision is in r{}:r{}'
+                    .format(rev, state['good'] + 1, state['bad'])))
+                return WARNINGS
+            state = dict(state)
+            if verdict == 'good' or rev <= state['good']:
+                # Up to the requested revision, nothing changed since rev
+                # (nor, in the second case, since the good revision)
+                state['good'] = max(rev, state.get('testing', rev))
+            else:
+                state['bad'] = rev
+
+        if state['bad'] - state['good'] <= 1:
+            self.setProperty('bisect_first_bad', state['bad'], 'BisectGCCRegression')
+            yield self.addCompleteLog('bisection', format_report(
+                state, 'First bad revision: r{}'.format(state['bad'])))
+            return WARNINGS if state['bad'] != state['origin'] else SUCCESS
+
+        middle = (state['good'] + state['bad']) // 2
+        sourcestamp = self.build.getAllSourceStamps()[0].asDict()
+        sourcestamp['revision'] = str(middle)
+        self.sourceStamps = [sourcestamp]
+        state = dict(state, testing=middle)
+        self.set_properties = {'bisect': state,
+                               'targeted_tests': targeted_tests(state)}
+
+        yield self.addCompleteLog('bisection', format_report(
+            state, 'Testing r{} (good: r{}, bad: r{})'.format(middle, state['good'], state['bad'])))
+        result = yield super().run()
+        return result
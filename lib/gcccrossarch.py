@@ -0,0 +1,26 @@
+# Python class that calls script on the Master to classify regressions
+# across architectures
+
+import os
+from buildbot.plugins import util, steps
+
+class GCCCrossArchAnalysis(steps.MasterShellCommand):
+    """This step classifies the regressions of the revision across the
+    builders of the other architectures (see lib/crossarch.py).  Every
+    build of the revision re-runs it, the last one seeing all of them."""
+    name = 'Classify regressions across architectures'
+    description = 'Classifying regressions across architectures'
+    descriptionDone = 'Classified regressions across architectures'
+
+    def __init__(self, datadir, builders, langs, **kwargs):
+        """Simply initialize MasterShellCommand with the arguments to call the script."""
+        super().__init__(command=None, **kwargs)
+        self.command = [os.path.expanduser('~/gcc-buildbot/scripts/cross-arch-analysis.py'),
+                        "--data-dir", util.Interpolate("%(kw:datadir)s", datadir=datadir),
+                        "--branch", util.Interpolate('%(src::branch:~trunk)s')]
+        for builder in builders:
+            self.command += ["--builder", builder]
+        for lang in langs:
+            self.command += ["--lang", lang]
+        self.command.append(util.Property('got_revision'))
+        self.flunkOnFailure = False
@@ -0,0 +1,202 @@
+# Python class that sends one digest of the results of each revision,
+# aggregating the builds of every architecture (see lib/digest.py)
+
+import json
+import os
+from collections import OrderedDict
+
+from buildbot import config
+from buildbot.process.results import Results
+from buildbot.reporters import utils
+from buildbot.util import service
+from twisted.internet import defer, reactor, threads
+from twisted.python import log
+
+from lib.artifactstore import ArtifactStore
+from lib.digest import render_digest, make_mail, send_mails
+from lib.gccartifacts import STORE_DIR
+from lib.gccbisect import load_regressions
+
+# Builds of these schedulers are not regular builds of a revision: they
+# re-test, bisect or try patches (see master.cfg)
+SKIPPED_SCHEDULER_PREFIXES = ('racy', 'bisect', 'try')
+
+# Number of revisions whose digest was sent remembered, to drop the
+# builds finishing after the timeout
+FLUSHED_KEEP = 1000
+
+
+def load_crossarch(datadir, branch, rev):
+    """Returns the cross-architecture classification of rev (see
+    scripts/cross-arch-analysis.py), or {}."""
+    path = os.path.join(datadir, 'crossarch', branch, 'r{}.json'.format(rev))
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_slowdowns(datadir, builder, branch, rev):
+    """Returns the compile-time slowdowns of rev found by
+    scripts/perf-analysis.py on builder, or {}."""
+    path = os.path.join(datadir, builder, 'perf', branch, 'r{}.slowdowns.json'.format(rev))
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class DigestService(service.BuildbotService):
+    """This service sends a single mail with the results of a revision
+    on all the builders, instead of one per build.  It waits for all the
+    builders to finish a build of the revision, or for timeout seconds
+    after the first one finished, then renders the digest (see
+    lib/digest.py).  The digests rendered within batch_delay seconds of
+    each other, e.g. during a burst of commits, are sent through a
+    single SMTP session.
+
+    The builders expected for a branch are those of branch_builders
+    ({branch: [builder, ...]}) if it has the branch, or else builders."""
+    name = 'DigestService'
+
+    consumer = None
+    send_call = None
+
+    def checkConfig(self, builders, mail_from, mail_to, timeout=4 * 3600, batch_delay=60,
+                    datadir='/home/gcc-buildbot/data', storedir=STORE_DIR, smtp_host='localhost',
+                    branch_builders=None):
+        if not builders or not all((branch_builders or {}).values()):
+            config.error('DigestService: builders must not be empty')
+        if timeout <= 0:
+            config.error('DigestService: timeout must be positive')
+
+    def reconfigService(self, builders, mail_from, mail_to, timeout=4 * 3600, batch_delay=60,
+                        datadir='/home/gcc-buildbot/data', storedir=STORE_DIR, smtp_host='localhost',
+                        branch_builders=None):
+        self.builders = list(builders)
+        self.branch_builders = {branch: list(names)
+                                for branch, names in (branch_builders or {}).items()}
+        self.mail_from = mail_from
+        self.mail_to = mail_to
+        self.timeout = timeout
+        self.batch_delay = batch_delay
+        self.datadir = datadir
+        self.storedir = storedir
+        self.smtp_host = smtp_host
+        return defer.succeed(None)
+
+    def expected(self, branch):
+        """Returns the builders expected to build the revisions of branch."""
+        return self.branch_builders.get(branch, self.builders)
+
+    @defer.inlineCallbacks
+    def startService(self):
+        # (branch, revision) -> {'builds': {builder: build}, 'change': change, 'timer': call}
+        self.pending = {}
+        self.flushed = OrderedDict()
+        self.outbox = []
+        yield super().startService()
+        self.consumer = yield self.master.mq.startConsuming(self.buildFinished,
+                                                            ('builds', None, 'finished'))
+
+    @defer.inlineCallbacks
+    def stopService(self):
+        if self.consumer is not None:
+            self.consumer.stopConsuming()
+            self.consumer = None
+        for entry in self.pending.values():
+            if entry['timer'].active():
+                entry['timer'].cancel()
+        self.pending = {}
+        if self.send_call is not None and self.send_call.active():
+            self.send_call.cancel()
+        self.send_call = None
+        yield super().stopService()
+
+    @defer.inlineCallbacks
+    def buildFinished(self, _, build):
+        try:
+            builder = yield self.master.db.builders.getBuilder(build['builderid'])
+            properties = yield self.master.db.builds.getBuildProperties(build['buildid'])
+        except Exception as e:  # pylint: disable=broad-except
+            log.err(e, 'DigestService: failed to read build {}'.format(build['buildid']))
+            return
+
+        scheduler = properties.get('scheduler', ('', None))[0] or ''
+        revision = properties.get('got_revision', (None, None))[0]
+        branch = properties.get('branch', (None, None))[0] or 'trunk'
+        if (builder['name'] not in self.expected(branch) or not revision
+                or scheduler.startswith(SKIPPED_SCHEDULER_PREFIXES)):
+            return
+        key = (branch, int(revision))
+        if key in self.flushed:
+            log.msg('DigestService: {} finished r{} after its digest was sent'
+                    .format(builder['name'], revision))
+            return
+
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = {'builds': {}, 'change': None,
+                     'timer': reactor.callLater(self.timeout, self.flush, key)}
+            self.pending[key] = entry
+        entry['builds'][builder['name']] = {
+            'builder': builder['name'],
+            'results': Results[build['results']] if build['results'] is not None else 'unknown',
+            'url': utils.getURLForBuild(self.master, build['builderid'], build['number'])}
+        if entry['change'] is None:
+            changes = yield self.master.db.changes.getChangesForBuild(build['buildid'])
+            matching = [change for change in changes if change['revision'] == str(revision)]
+            entry['change'] = (matching or changes or [None])[-1]
+
+        if set(self.expected(branch)) <= set(entry['builds']):
+            entry['timer'].cancel()
+            yield self.flush(key)
+
+    @defer.inlineCallbacks
+    def flush(self, key):
+        """Renders the digest of key, and queues it for sending."""
+        entry = self.pending.pop(key, None)
+        if entry is None:
+            return
+        self.flushed[key] = True
+        while len(self.flushed) > FLUSHED_KEEP:
+            self.flushed.popitem(last=False)
+        branch, rev = key
+        try:
+            builds, crossarch = yield threads.deferToThread(self.load, branch, rev,
+                                                            list(entry['builds'].values()))
+            subject, text = render_digest(branch, rev, entry['change'], builds,
+                                          set(self.expected(branch)) - set(entry['builds']),
+                                          crossarch, self.timeout)
+        except Exception as e:  # pylint: disable=broad-except
+            log.err(e, 'DigestService: failed to render the digest of r{}'.format(rev))
+            return
+
+        self.outbox.append(make_mail(subject, text, self.mail_from, self.mail_to,
+                                     '<{}-digest@gcc-build>'.format(rev)))
+        if self.send_call is None or not self.send_call.active():
+            self.send_call = reactor.callLater(self.batch_delay, self.sendOutbox)
+
+    def load(self, branch, rev, builds):
+        """Returns the builds with their regressions and compile-time
+        slowdowns, and the cross-architecture classification of rev.
+        Runs in a thread."""
+        store = ArtifactStore(self.storedir)
+        for build in builds:
+            build['regressions'] = load_regressions(store, build['builder'], branch, rev)
+            build['slowdowns'] = load_slowdowns(self.datadir, build['builder'], branch, rev)
+        return builds, load_crossarch(self.datadir, branch, rev)
+
+    @defer.inlineCallbacks
+    def sendOutbox(self):
+        mails, self.outbox = self.outbox, []
+        if not mails:
+            return
+        try:
+            yield threads.deferToThread(send_mails, mails, self.smtp_host)
+        except Exception as e:  # pylint: disable=broad-except
+            log.err(e, 'DigestService: failed to send {} digests'.format(len(mails)))
+            return
+        log.msg('DigestService: sent {} digests'.format(len(mails)))
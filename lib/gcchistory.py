@@ -0,0 +1,33 @@
+# Python class that calls script on the Master to update the per-test
+# history index
+
+import os
+from buildbot.plugins import util, steps
+
+from lib.gccartifacts import STORE_DIR
+
+# Where the per-test history index lives on the master
+HISTORY_DB = '/home/gcc-buildbot/data/history.sqlite'
+
+class GCCIndexTestHistory(steps.MasterShellCommand):
+    """This simple step calls a script in master that adds the
+    outcomes of the stored .sum file of lang to the per-test history
+    index."""
+    name = 'Index test history'
+    description = 'Indexing test history'
+    descriptionDone = 'Indexed test history'
+
+    def __init__(self, lang, db=HISTORY_DB, storedir=STORE_DIR, **kwargs):
+        """Simply initialize MasterShellCommand with the arguments to call the script."""
+        super().__init__(command=None, **kwargs)
+        self.command = [os.path.expanduser('~/gcc-buildbot/scripts/test-history.py'),
+                        'ingest',
+                        '--db', db,
+                        '--store', storedir,
+                        '--builder', util.Property('buildername'),
+                        '--branch', util.Interpolate('%(src::branch:~trunk)s'),
+                        '--lang', lang,
+                        util.Property('got_revision')]
+        # The index is a convenience, do not fail the build because of it
+        self.flunkOnFailure = False
+        self.warnOnFailure = True
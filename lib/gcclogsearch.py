@@ -0,0 +1,40 @@
+# Python class that calls script on the Master to add the stored
+# DejaGnu logs to the trigram search index
+
+import os
+from buildbot.plugins import util, steps
+
+from lib.gccartifacts import STORE_DIR
+
+# Where the log search index lives on the master
+LOGSEARCH_DB = '/home/gcc-buildbot/data/logsearch.sqlite'
+
+class GCCIndexLogs(steps.MasterShellCommand):
+    """This simple step calls a script in master that indexes the
+    stored <lang>.log file, so that it can be searched without
+    decompressing it."""
+    name = 'Index test logs'
+    description = 'Indexing test logs'
+    descriptionDone = 'Indexed test logs'
+
+    def __init__(self, lang, db=LOGSEARCH_DB, storedir=STORE_DIR,
+                 builder=util.Property('buildername'),
+                 branch=util.Interpolate('%(src::branch:~trunk)s'),
+                 revision=util.Property('got_revision'),
+                 **kwargs):
+        """Simply initialize MasterShellCommand with the arguments to call the script.
+
+        The log of the current build is indexed, unless builder, branch
+        and revision say otherwise."""
+        super().__init__(command=None, **kwargs)
+        self.command = [os.path.expanduser('~/gcc-buildbot/scripts/log-search.py'),
+                        'index',
+                        '--db', db,
+                        '--store', storedir,
+                        '--builder', builder,
+                        '--branch', branch,
+                        '--name', util.Interpolate('%(kw:lang)s.log', lang=lang),
+                        revision]
+        # The index is a convenience, do not fail the build because of it
+        self.flunkOnFailure = False
+        self.warnOnFailure = True
@@ -0,0 +1,180 @@
+# Python classes that collect the metrics of the Master (see
+# lib/metrics.py) and expose them on a local HTTP endpoint
+
+import os
+import re
+import time
+
+from buildbot import config
+from buildbot.plugins import steps
+from buildbot.process.results import SUCCESS
+from buildbot.util import service, datetime2epoch
+from prometheus_client.twisted import MetricsResource
+from twisted.internet import defer, reactor, task
+from twisted.python import log
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+from lib.gccregression import GCCRegressionAnalysis
+from lib.metrics import (BUILDREQUESTS_PENDING, WORKER_CONNECTED, STEP_DURATION_SECONDS,
+                         ANALYSIS_DURATION_SECONDS, UPLOAD_BYTES, UPLOAD_THROUGHPUT)
+from lib.profiling import PROFILING_MODES, profiling_mode, set_profiling_mode
+
+# Suffix buildbot adds to the names of steps repeated in a build
+STEP_SUFFIX_RE = re.compile(r'_\d+$')
+
+
+def to_epoch(timestamp):
+    return datetime2epoch(timestamp) if hasattr(timestamp, 'timetuple') else timestamp
+
+
+class ProfilingResource(Resource):
+    """/profiling: GET returns the profiling mode of the analysis
+    scripts, POST with mode=off|cprofile|tracemalloc changes it."""
+    isLeaf = True
+
+    def render_GET(self, request):
+        request.setHeader(b'Content-Type', b'text/plain')
+        return '{}\n'.format(profiling_mode()).encode('utf-8')
+
+    def render_POST(self, request):
+        mode = request.args.get(b'mode', [b''])[0].decode('utf-8', 'replace')
+        if mode not in PROFILING_MODES:
+            request.setResponseCode(400)
+            return 'mode must be one of {}\n'.format(', '.join(PROFILING_MODES)).encode('utf-8')
+        set_profiling_mode(mode)
+        log.msg('MetricsService: profiling of the analysis set to {}'.format(mode))
+        return self.render_GET(request)
+
+
+class MetricsService(service.BuildbotService):
+    """This service exposes the metrics of the master in the
+    Prometheus text format on http://<interface>:<port>/metrics, and
+    the switch of the profiling of the analysis scripts on
+    /profiling.  The queue depth and the worker availability are
+    polled every interval seconds, the step durations are recorded as
+    the steps finish."""
+    name = 'MetricsService'
+
+    loop = None
+    listener = None
+    consumer = None
+    interval = 30
+    port = None
+    interface = None
+
+    def checkConfig(self, port=9101, interface='127.0.0.1', interval=30, profiling='off'):
+        if interval <= 0:
+            config.error('MetricsService: interval must be positive')
+        if profiling not in PROFILING_MODES:
+            config.error('MetricsService: profiling must be one of {}'
+                         .format(', '.join(PROFILING_MODES)))
+
+    @defer.inlineCallbacks
+    def reconfigService(self, port=9101, interface='127.0.0.1', interval=30, profiling='off'):
+        set_profiling_mode(profiling)
+        self.interval = interval
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+            self.loop.start(interval, now=False)
+
+        if self.listener is not None and (port, interface) != (self.port, self.interface):
+            yield self.listener.stopListening()
+            self.listener = None
+        self.port = port
+        self.interface = interface
+        if self.running and self.listener is None:
+            self.listen()
+
+    def listen(self):
+        root = Resource()
+        root.putChild(b'metrics', MetricsResource())
+        root.putChild(b'profiling', ProfilingResource())
+        self.listener = reactor.listenTCP(self.port, Site(root), interface=self.interface)
+
+    @defer.inlineCallbacks
+    def startService(self):
+        yield super().startService()
+        self.listen()
+        self.consumer = yield self.master.mq.startConsuming(self.stepFinished,
+                                                            ('steps', None, 'finished'))
+        self.loop = task.LoopingCall(self.poll)
+        self.loop.start(self.interval, now=True)
+
+    @defer.inlineCallbacks
+    def stopService(self):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        if self.consumer is not None:
+            self.consumer.stopConsuming()
+            self.consumer = None
+        if self.listener is not None:
+            yield self.listener.stopListening()
+            self.listener = None
+        yield super().stopService()
+
+    @defer.inlineCallbacks
+    def poll(self):
+        """Updates the build request queue depth and the worker
+        availability.  Errors are logged, and never stop the service."""
+        try:
+            builders = yield self.master.db.builders.getBuilders()
+            buildrequests = yield self.master.db.buildrequests.getBuildRequests(claimed=False,
+                                                                                complete=False)
+            workers = yield self.master.db.workers.getWorkers()
+        except Exception as e:  # pylint: disable=broad-except
+            log.err(e, 'MetricsService: failed to poll the database')
+            return
+
+        names = {builder['id']: builder['name'] for builder in builders}
+        pending = {name: 0 for name in names.values()}
+        for buildrequest in buildrequests:
+            if buildrequest['builderid'] in names:
+                pending[names[buildrequest['builderid']]] += 1
+        for name, count in pending.items():
+            BUILDREQUESTS_PENDING.labels(name).set(count)
+
+        for worker in workers:
+            WORKER_CONNECTED.labels(worker['name']).set(1 if worker['connected_to'] else 0)
+
+    @defer.inlineCallbacks
+    def stepFinished(self, _, step):
+        """Records the duration of a finished step."""
+        if not step.get('started_at') or not step.get('complete_at'):
+            return
+        duration = to_epoch(step['complete_at']) - to_epoch(step['started_at'])
+        try:
+            build = yield self.master.db.builds.getBuild(step['buildid'])
+            builder = yield self.master.db.builders.getBuilder(build['builderid'])
+        except Exception as e:  # pylint: disable=broad-except
+            log.err(e, 'MetricsService: failed to find the builder of step {}'
+                    .format(step.get('stepid')))
+            return
+
+        name = STEP_SUFFIX_RE.sub('', step['name'])
+        STEP_DURATION_SECONDS.labels(builder['name'], name).observe(duration)
+        if name == GCCRegressionAnalysis.name:
+            ANALYSIS_DURATION_SECONDS.labels(builder['name']).observe(duration)
+
+
+class MeteredFileUpload(steps.FileUpload):
+    """FileUpload recording the amount of data uploaded and the
+    throughput of the upload (see lib/metrics.py)."""
+    upload_started = None
+
+    def start(self):
+        self.upload_started = time.time()
+        return super().start()
+
+    def finished(self, results):
+        if results == SUCCESS and self.upload_started is not None:
+            try:
+                size = os.path.getsize(os.path.expanduser(self.masterdest))
+            except OSError:
+                size = None
+            if size is not None:
+                builder = self.getProperty('buildername')
+                elapsed = max(time.time() - self.upload_started, 1e-3)
+                UPLOAD_BYTES.labels(builder).inc(size)
+                UPLOAD_THROUGHPUT.labels(builder).observe(size / elapsed)
+        return super().finished(results)
@@ -0,0 +1,23 @@
+# Python class that calls script on the Master to do GCC compile-time
+# performance analysis
+
+import os
+from buildbot.plugins import util, steps
+
+class GCCPerfAnalysis(steps.MasterShellCommand):
+    """This simple step just calls a script in master that compares
+    the compile-time measurements of the current revision with a
+    rolling baseline of previous revisions and fails if a
+    statistically significant slowdown is detected."""
+    name = 'Analyse compile-time performance'
+    description = 'Analysing compile-time performance'
+    descriptionDone = 'Analysed compile-time performance'
+
+    def __init__(self, datadir, **kwargs):
+        """Simply initialize MasterShellCommand with the arguments to call the script."""
+        super().__init__(command=None, **kwargs)
+        self.command = [os.path.expanduser('~/gcc-buildbot/scripts/perf-analysis.py'),
+                        "--data-dir", util.Interpolate("%(kw:datadir)s", datadir=datadir),
+                        "--builder", util.Property('buildername'),
+                        "--branch", util.Interpolate('%(src::branch:~trunk)s'),
+                        util.Property('got_revision')]
@@ -3,6 +3,14 @@
 import os
 from buildbot.plugins import util, steps
 
+from lib.profiling import profiling_mode
+
+@util.renderer
+def analysis_profiling(props):
+    """Profiling mode of the analysis, switched at runtime (see
+    MetricsService)."""
+    return profiling_mode()
+
 class GCCRegressionAnalysis(steps.MasterShellCommand):
     """This simple step just calls a script in master that deals
     with the gory details of determining if a regression was
@@ -11,11 +19,13 @@ class GCCRegressionAnalysis(steps.MasterShellCommand):
     description = 'Analysing test results'
     descriptionDone = 'Analysed test results'
 
-    def __init__(self, datadir, **kwargs):
+    def __init__(self, datadir, lang, **kwargs):
         """Simply initialize MasterShellCommand with the arguments to call the script."""
         super().__init__(command=None, **kwargs)
         self.command = [os.path.expanduser('~/gcc-buildbot/scripts/regression-analysis.py'),
                         "--data-dir", util.Interpolate("%(kw:datadir)s", datadir=datadir),
                         "--builder", util.Property('buildername'),
-                        "--branch", util.Property('branch'),
+                        "--lang", lang,
+                        "--branch", util.Interpolate('%(src::branch:~trunk)s'),
+                        "--profile", analysis_profiling,
                         util.Property('got_revision')]
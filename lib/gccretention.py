@@ -0,0 +1,86 @@
+# Python class that periodically runs the retention policy of the
+# results data directory on the Master
+
+import os
+
+from buildbot import config
+from buildbot.util import service
+from twisted.internet import defer, task, utils
+from twisted.python import log
+
+from lib.gccartifacts import STORE_DIR
+
+class DataRetentionService(service.BuildbotService):
+    """This service runs scripts/data-retention.py every interval
+    seconds.  The script runs at idle I/O priority and stops after
+    about budget bytes of I/O, so that it never competes with the
+    analysis of live builds; the remaining work is done by the next
+    runs.  The garbage collection of the store, which is not bounded,
+    is run separately every gc_interval seconds, never at the same
+    time as the retention."""
+    name = 'DataRetentionService'
+
+    loop = None
+    gc_loop = None
+    interval = 600
+    gc_interval = 24 * 3600
+
+    def checkConfig(self, storedir=STORE_DIR, interval=600, keep_logs=50,
+                    archive_after=90, budget=64 * 1024 * 1024, gc_interval=24 * 3600):
+        if interval <= 0:
+            config.error('DataRetentionService: interval must be positive')
+        if gc_interval <= 0:
+            config.error('DataRetentionService: gc_interval must be positive')
+        if keep_logs < 0:
+            config.error('DataRetentionService: keep_logs must not be negative')
+
+    def reconfigService(self, storedir=STORE_DIR, interval=600, keep_logs=50,
+                        archive_after=90, budget=64 * 1024 * 1024, gc_interval=24 * 3600):
+        self.command = ['ionice', '-c3', 'nice', '-n', '19',
+                        os.path.expanduser('~/gcc-buildbot/scripts/data-retention.py'),
+                        '--store', storedir,
+                        '--keep-logs', str(keep_logs),
+                        '--archive-after', str(archive_after),
+                        '--budget', str(budget)]
+        self.interval = interval
+        self.gc_interval = gc_interval
+
+        # Restart the loops with the new intervals
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+            self.loop.start(interval, now=False)
+        if self.gc_loop is not None and self.gc_loop.running:
+            self.gc_loop.stop()
+            self.gc_loop.start(gc_interval, now=False)
+        return defer.succeed(None)
+
+    def startService(self):
+        self.lock = defer.DeferredLock()
+        self.loop = task.LoopingCall(self.runRetention)
+        self.loop.start(self.interval, now=False)
+        self.gc_loop = task.LoopingCall(self.runRetention, gc=True)
+        self.gc_loop.start(self.gc_interval, now=False)
+        return super().startService()
+
+    def stopService(self):
+        for loop in [self.loop, self.gc_loop]:
+            if loop is not None and loop.running:
+                loop.stop()
+        return super().stopService()
+
+    @defer.inlineCallbacks
+    def runRetention(self, gc=False):
+        """Runs the retention script once, or its garbage collection if
+        gc.  Errors are logged, and never stop the service."""
+        command = self.command + ['--gc'] if gc else self.command
+        try:
+            out, err, code = yield self.lock.run(utils.getProcessOutputAndValue,
+                                                 command[0], command[1:], env=os.environ)
+        except Exception as e:  # pylint: disable=broad-except
+            log.err(e, 'DataRetentionService: failed to run retention')
+            return
+
+        if code not in (0, 2):
+            log.msg('DataRetentionService: retention failed with {}:\n{}{}'
+                    .format(code, out.decode('utf-8', 'replace'),
+                            err.decode('utf-8', 'replace')))
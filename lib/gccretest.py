@@ -0,0 +1,152 @@
+# Python class that re-tests the regressions found by
+# GCCRegressionAnalysis to tell the confirmed ones from the flaky ones
+
+import os
+
+from buildbot.plugins import util, steps
+from buildbot.process.results import SUCCESS, WARNINGS, SKIPPED
+from twisted.internet import defer
+
+from lib.artifactstore import ArtifactStore
+from lib.dejagnu import SumFile
+from lib.gccartifacts import STORE_DIR
+from lib.gccbisect import TARGETED_DIR, can_target, load_regressions, targeted_tests
+
+# Number of times a re-test build runs the regressed tests
+RETEST_REPEAT = 3
+
+
+def retest_dir(targeteddir, builder, branch, rev, run):
+    """Where the .sum files of a run of a re-test build are uploaded."""
+    return os.path.join(targeteddir, builder, branch, 'r{}'.format(rev),
+                        'retest-{}'.format(run))
+
+
+def start_retest(store, builder, branch, rev, repeat=RETEST_REPEAT):
+    """Returns the re-test state for the regressions of rev, or None.
+
+    Only the regressions which can be re-run in isolation (see
+    lib/gccbisect.can_target) are re-tested."""
+    tests = {}
+    for lang, (_, regressions) in load_regressions(store, builder, branch, rev).items():
+        regressions = [r for r in regressions if can_target(r)]
+        if regressions:
+            tests[lang] = regressions
+    if not tests:
+        return None
+    return {'origin': rev, 'repeat': repeat, 'tests': tests}
+
+
+def verdicts(state, builder, branch, targeteddir=TARGETED_DIR):
+    """Returns {lang: [(regression, reproduced), ...]}, reproduced being
+    the number of runs of the re-test in which the regression showed up
+    again, or None if no run could be found (e.g. the build failed)."""
+    runs = {}
+    for lang in state['tests']:
+        runs[lang] = []
+        for run in range(state['repeat']):
+            path = os.path.join(retest_dir(targeteddir, builder, branch, state['origin'], run),
+                                '{}.sum'.format(lang))
+            if os.path.exists(path):
+                runs[lang].append(SumFile(path))
+
+    result = {}
+    for lang, regressions in sorted(state['tests'].items()):
+        result[lang] = []
+        for regression in regressions:
+            if not runs[lang]:
+                reproduced = None
+            else:
+                reproduced = sum(1 for sumfile in runs[lang]
+                                 if sumfile.testname_to_outcome.get(regression['test']) == regression['after'])
+            result[lang].append((regression, reproduced))
+    return result
+
+
+def verdict(reproduced, runs):
+    if reproduced is None:
+        return 'untested'
+    if reproduced == runs:
+        return 'confirmed'
+    return 'flaky'
+
+
+def overall_verdict(state, found):
+    """Returns 'confirmed' if any regression showed up in every run,
+    'flaky' if none did but some could be run, 'untested' otherwise."""
+    found = {verdict(reproduced, state['repeat'])
+             for results in found.values() for _, reproduced in results}
+    for result in ['confirmed', 'flaky']:
+        if result in found:
+            return result
+    return 'untested'
+
+
+def format_report(state, found):
+    text = 'Re-test of the regressions of r{} ({} runs)\n\n'.format(state['origin'], state['repeat'])
+    for lang, results in sorted(found.items()):
+        for regression, reproduced in results:
+            text += '\t{}: {}: {} -> {}: {}'.format(verdict(reproduced, state['repeat']), lang,
+                                                    regression['before'], regression['after'],
+                                                    regression['test'])
+            if reproduced is not None:
+                text += ' ({}/{})'.format(reproduced, state['repeat'])
+            text += '\n'
+    return text
+
+
+class RetestGCCRegression(steps.Trigger):
+    """This step re-tests the regressions found by GCCRegressionAnalysis,
+    to tell the confirmed regressions from the flaky tests without a
+    full rebuild.
+
+    On a regular build with regressions it triggers, on the
+    'racy-<builder>' scheduler, a re-test build of the same revision,
+    which runs the regressed tests RETEST_REPEAT times in the warm
+    incremental builddir (see the 'targeted_tests' property).  In the
+    re-test build this step reads the results of the runs and sets the
+    'retest_verdict' property (see overall_verdict); the verdict of each
+    regression is in the 'retest' log."""
+    name = 'Retest regression'
+    description = 'Re-testing regression'
+    descriptionDone = 'Re-tested regression'
+
+    def __init__(self, storedir=STORE_DIR, targeteddir=TARGETED_DIR, repeat=RETEST_REPEAT, **kwargs):
+        super().__init__(schedulerNames=[util.Interpolate('racy-%(prop:buildername)s')],
+                         waitForFinish=False,
+                         **kwargs)
+        self.storedir = storedir
+        self.targeteddir = targeteddir
+        self.repeat = repeat
+        # Re-testing is a best effort, it never fails the build
+        self.flunkOnFailure = False
+        self.warnOnFailure = True
+
+    @defer.inlineCallbacks
+    def run(self):
+        builder = self.getProperty('buildername')
+        branch = self.getProperty('branch') or 'trunk'
+        rev = int(self.getProperty('got_revision'))
+        state = self.getProperty('retest')
+
+        if state:
+            found = verdicts(state, builder, branch, self.targeteddir)
+            overall = overall_verdict(state, found)
+            self.setProperty('retest_verdict', overall, 'RetestGCCRegression')
+            yield self.addCompleteLog('retest', format_report(state, found))
+            self.descriptionDone = 'Re-tested regression: {}'.format(overall)
+            return SUCCESS if overall == 'flaky' else WARNINGS
+
+        state = start_retest(ArtifactStore(self.storedir), builder, branch, rev, self.repeat)
+        if state is None:
+            return SKIPPED
+
+        sourcestamp = self.build.getAllSourceStamps()[0].asDict()
+        sourcestamp['revision'] = str(rev)
+        self.sourceStamps = [sourcestamp]
+        self.set_properties = {'retest': state,
+                               'targeted_tests': targeted_tests(state)}
+        yield self.addCompleteLog('retest', 'Re-testing {} regressions of r{} {} times\n'.format(
+            sum(len(regressions) for regressions in state['tests'].values()), rev, self.repeat))
+        result = yield super().run()
+        return result
@@ -0,0 +1,74 @@
+# Python classes that select the tests of a build according to its
+# test profile (see lib/testprofiles.py) and update the statistics the
+# selection is based on
+
+import os
+
+from buildbot.plugins import util, steps
+from buildbot.process import buildstep
+from buildbot.process.results import SUCCESS
+from twisted.internet import defer
+
+from lib.gccartifacts import STORE_DIR
+from lib.testprofiles import PROFILES, TestStats
+
+# Per-driver statistics of each builder: <STATS_DIR>/<builder>.json.
+# Workers upload the driver durations of each build to
+# <STATS_DIR>/<builder>/r<rev>.times
+STATS_DIR = '/home/gcc-buildbot/data/teststats'
+
+
+class SelectTestProfile(buildstep.BuildStep):
+    """This step selects the DejaGnu drivers to run in the time budget
+    of a test profile, and stores the resulting RUNTESTFLAGS in the
+    "runtestflags" property (empty to run the whole testsuite)."""
+    name = 'Select tests'
+    description = 'Selecting tests'
+    descriptionDone = 'Selected tests'
+
+    def __init__(self, profile, statsdir=STATS_DIR, **kwargs):
+        super().__init__(**kwargs)
+        self.profile = PROFILES[profile]
+        self.statsdir = statsdir
+
+    @defer.inlineCallbacks
+    def run(self):
+        builder = self.getProperty('buildername')
+        jobs = int(self.getProperty('jobs') or 1)
+        stats = TestStats(os.path.join(self.statsdir, '{}.json'.format(builder)))
+        exps = stats.select(self.profile, jobs)
+
+        if exps is None:
+            self.setProperty('runtestflags', '', 'SelectTestProfile')
+            text = 'Profile {}: running the whole testsuite\n'.format(self.profile.name)
+        else:
+            self.setProperty('runtestflags', ' '.join(exps), 'SelectTestProfile')
+            estimate = sum(stats.exps[exp]['duration'] for exp in exps) / jobs
+            text = 'Profile {}: running {} of {} drivers, about {:.0f} minutes\n\n'.format(
+                self.profile.name, len(exps), len(stats.exps), estimate / 60)
+            text += '\n'.join(exps) + '\n'
+
+        yield self.addCompleteLog('selection', text)
+        return SUCCESS
+
+
+class GCCUpdateTestStats(steps.MasterShellCommand):
+    """This simple step just calls a script in master that adds the
+    driver durations and regressions of the build to the statistics
+    of the builder."""
+    name = 'Update test statistics'
+    description = 'Updating test statistics'
+    descriptionDone = 'Updated test statistics'
+
+    def __init__(self, statsdir=STATS_DIR, storedir=STORE_DIR, **kwargs):
+        """Simply initialize MasterShellCommand with the arguments to call the script."""
+        super().__init__(command=None, **kwargs)
+        self.command = [os.path.expanduser('~/gcc-buildbot/scripts/test-stats.py'),
+                        'update',
+                        '--stats-dir', statsdir,
+                        '--store', storedir,
+                        '--builder', util.Property('buildername'),
+                        '--branch', util.Interpolate('%(src::branch:~trunk)s'),
+                        util.Property('got_revision')]
+        # Statistics are a best effort, they never fail the build
+        self.flunkOnFailure = False
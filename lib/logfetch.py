@@ -0,0 +1,117 @@
+# On-demand fetching of the DejaGnu .log files kept on the workers.
+#
+# Workers only upload the .sum files and their summaries; the .log
+# files stay in a bounded cache on the worker which ran the build (see
+# scripts/log-cache).  They are fetched by builds of the LogFetch
+# builder, on that same worker, either:
+#
+#  - automatically, for the languages with regressions (GCCFetchLogs);
+#  - on request, through the 'force-logfetch' force scheduler, from the
+#    web interface or its REST API (LogFetchClient, used by
+#    scripts/fetch-log.py).  A single test can be asked for, in which
+#    case only the part of the log about it is shown.
+#
+# A fetched log is stored in the artifact store and indexed for
+# searching like the other results.
+
+import requests
+from buildbot.plugins import util, steps
+
+from lib.artifactstore import ArtifactStore
+from lib.gccartifacts import STORE_DIR
+from lib.gccbisect import load_regressions
+
+LOGFETCH_BUILDER = 'LogFetch'
+LOGFETCH_SCHEDULER = 'fetch-logs'
+LOGFETCH_FORCE_SCHEDULER = 'force-logfetch'
+
+# Properties of the LogFetch builds
+FETCH_PROPERTIES = ['fetch_worker', 'fetch_builder', 'fetch_branch', 'fetch_revision',
+                    'fetch_lang', 'fetch_test']
+
+
+def can_fetch_on_worker(builder, workerforbuilder, buildrequest):
+    """canStartBuild function of the LogFetch builder: logs can only be
+    fetched from the worker which ran the build."""
+    wanted = buildrequest.properties.getProperty('fetch_worker')
+    return wanted is None or workerforbuilder.worker.workername == wanted
+
+
+def has_regressions(lang, storedir=STORE_DIR):
+    """Returns a doStepIf function, true if lang regressed in the build."""
+    def check(step):
+        return lang in load_regressions(ArtifactStore(storedir),
+                                        step.getProperty('buildername'),
+                                        step.getProperty('branch') or 'trunk',
+                                        int(step.getProperty('got_revision')))
+    return check
+
+
+class GCCFetchLogs(steps.Trigger):
+    """This step triggers a LogFetch build fetching the .log file of lang
+    of the current build from the worker into the artifact store."""
+    name = 'Fetch test logs'
+    description = 'Fetching test logs'
+    descriptionDone = 'Requested test logs'
+
+    def __init__(self, lang, **kwargs):
+        super().__init__(schedulerNames=[LOGFETCH_SCHEDULER],
+                         waitForFinish=False,
+                         set_properties={'fetch_worker': util.Property('workername'),
+                                         'fetch_builder': util.Property('buildername'),
+                                         'fetch_branch': util.Interpolate('%(src::branch:~trunk)s'),
+                                         'fetch_revision': util.Property('got_revision'),
+                                         'fetch_lang': lang,
+                                         'fetch_test': ''},
+                         **kwargs)
+        self.flunkOnFailure = False
+
+
+class LogFetchClient:
+    """
+    Requests LogFetch builds through the REST API of the master at url.
+    """
+    def __init__(self, url):
+        self.url = url.rstrip('/') + '/api/v2'
+
+    def get(self, path, **params):
+        response = requests.get(self.url + path, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def find_worker(self, builder, revision):
+        """Returns the name of the worker of the last build of revision on builder, or None."""
+        builderid = self.get('/builders', name=builder)['builders'][0]['builderid']
+        builds = self.get('/builders/{}/builds'.format(builderid), order='-number', limit=500,
+                          property=['got_revision', 'workername'])['builds']
+        for build in builds:
+            got_revision = build['properties'].get('got_revision', [None])[0]
+            if got_revision is not None and str(got_revision) == str(revision):
+                return build['properties']['workername'][0]
+        return None
+
+    def request(self, builder, branch, revision, lang, test=''):
+        """Requests the .log of lang (or the part about test) of revision.
+
+        Returns the buildset id."""
+        worker = self.find_worker(builder, revision)
+        if worker is None:
+            raise ValueError('No build of r{} found on {}'.format(revision, builder))
+
+        builderid = self.get('/builders', name=LOGFETCH_BUILDER)['builders'][0]['builderid']
+        params = {'builderid': builderid,
+                  'reason': 'Fetching {}.log of r{} of {}'.format(lang, revision, builder),
+                  'fetch_worker': worker,
+                  'fetch_builder': builder,
+                  'fetch_branch': branch,
+                  'fetch_revision': str(revision),
+                  'fetch_lang': lang,
+                  'fetch_test': test}
+        response = requests.post('{}/forceschedulers/{}'.format(self.url, LOGFETCH_FORCE_SCHEDULER),
+                                 json={'jsonrpc': '2.0', 'method': 'force', 'id': 1,
+                                       'params': params})
+        response.raise_for_status()
+        reply = response.json()
+        if 'error' in reply:
+            raise ValueError(reply['error']['message'])
+        return reply['result'][0]
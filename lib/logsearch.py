@@ -0,0 +1,201 @@
+# Trigram full-text search index over the DejaGnu logs.
+#
+# Logs are kept in the artifact store (see lib/artifactstore.py) as
+# independently compressed chunks, ending at line boundaries and
+# shared between revisions.  The index maps every trigram (three
+# consecutive bytes) to the chunks containing it, and every chunk to
+# the files (builder, branch, revision, name) using it.  Since chunks
+# are shared, a chunk is indexed only once, the first time it is seen.
+#
+# A substring or regular expression search first looks up the chunks
+# containing all the trigrams of the literal parts of the pattern, and
+# only decompresses those candidate chunks to confirm the matches.
+# Matches never span chunks, since chunks end at line boundaries.
+
+import logging as log
+import re
+import sqlite3
+
+try:
+    import re._parser as sre_parse  # Python >= 3.11
+    from re._constants import LITERAL
+except ImportError:
+    import sre_parse  # pylint: disable=deprecated-module
+    from sre_constants import LITERAL  # pylint: disable=deprecated-module
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS trigrams (
+    tri INTEGER NOT NULL,
+    chunk INTEGER NOT NULL,
+    PRIMARY KEY (tri, chunk)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    builder TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    rev INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    UNIQUE (builder, branch, rev, name));
+CREATE TABLE IF NOT EXISTS refs (
+    chunk INTEGER NOT NULL,
+    file INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (chunk, file, seq)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS refs_file ON refs (file);
+"""
+
+
+def trigrams(data):
+    """Returns the set of trigrams of data, as integers."""
+    result = set()
+    for line in data.split(b'\n'):
+        for i in range(len(line) - 2):
+            result.add(int.from_bytes(line[i:i + 3], 'big'))
+    return result
+
+
+def required_literals(pattern):
+    """Returns the literal strings any match of the regular expression must contain.
+
+    Only the top-level sequence of the pattern is considered, which is
+    enough for the usual ICE messages or assembler errors.  The trigrams
+    are case sensitive, so nothing is required of a case-insensitive
+    pattern, e.g. starting with (?i)."""
+    if re.compile(pattern).flags & re.IGNORECASE:
+        return []
+    literals = []
+    current = []
+    for op, arg in sre_parse.parse(pattern):
+        if op == LITERAL:
+            current.append(chr(arg))
+        else:
+            literals.append(''.join(current))
+            current = []
+    literals.append(''.join(current))
+    return [l for l in literals if len(l.encode('utf-8')) >= 3]
+
+
+class LogIndex:
+    """
+    Trigram index over the chunks of the logs of an ArtifactStore.
+    """
+    def __init__(self, path, store):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.store = store
+
+    def close(self):
+        self.db.close()
+
+    def chunk_id(self, digest):
+        """Returns (id, is_new) for digest."""
+        row = self.db.execute('SELECT id FROM chunks WHERE digest = ?', (digest,)).fetchone()
+        if row:
+            return row[0], False
+        return self.db.execute('INSERT INTO chunks (digest) VALUES (?)', (digest,)).lastrowid, True
+
+    def index_file(self, builder, branch, rev, name):
+        """Indexes a stored file.  Returns the number of new chunks indexed."""
+        manifest = self.store.manifest(builder, branch, rev, name)
+        new = 0
+        with self.db:
+            self.db.execute('INSERT OR IGNORE INTO files (builder, branch, rev, name) VALUES (?, ?, ?, ?)',
+                            (builder, branch, rev, name))
+            fileid = self.db.execute('SELECT id FROM files WHERE builder = ? AND branch = ? AND rev = ? AND name = ?',
+                                     (builder, branch, rev, name)).fetchone()[0]
+            self.db.execute('DELETE FROM refs WHERE file = ?', (fileid,))
+
+            for seq, (digest, _) in enumerate(manifest['chunks']):
+                chunk, is_new = self.chunk_id(digest)
+                if is_new:
+                    self.db.executemany('INSERT INTO trigrams (tri, chunk) VALUES (?, ?)',
+                                        ((tri, chunk) for tri in trigrams(self.store.read_chunk(digest))))
+                    new += 1
+                self.db.execute('INSERT INTO refs (chunk, file, seq) VALUES (?, ?, ?)',
+                                (chunk, fileid, seq))
+        return new
+
+    def candidate_chunks(self, literals):
+        """Returns the (id, digest) of the chunks containing all trigrams of literals.
+
+        Returns every chunk if there is no trigram to look up."""
+        wanted = set()
+        for literal in literals:
+            wanted |= trigrams(literal.encode('utf-8'))
+
+        if not wanted:
+            log.warning('No trigram to look up, every chunk will be searched')
+            return self.db.execute('SELECT id, digest FROM chunks').fetchall()
+
+        # Start from the rarest trigram, to keep intermediate sets small
+        counts = sorted((self.db.execute('SELECT COUNT(*) FROM trigrams WHERE tri = ?',
+                                         (tri,)).fetchone()[0], tri) for tri in wanted)
+        candidates = None
+        for _, tri in counts:
+            chunks = {c for c, in self.db.execute('SELECT chunk FROM trigrams WHERE tri = ?', (tri,))}
+            candidates = chunks if candidates is None else candidates & chunks
+            if not candidates:
+                return []
+
+        return [(c, self.db.execute('SELECT digest FROM chunks WHERE id = ?', (c,)).fetchone()[0])
+                for c in sorted(candidates)]
+
+    def search(self, pattern, regex=False, builder=None, branch=None, name=None, limit=1000):
+        """Yields (builder, branch, rev, name, line) for every matching line.
+
+        pattern is a plain substring, unless regex is True."""
+        if regex:
+            compiled = re.compile(pattern.encode('utf-8'))
+            literals = required_literals(pattern)
+        else:
+            compiled = re.compile(re.escape(pattern.encode('utf-8')))
+            literals = [pattern]
+
+        sql = 'SELECT DISTINCT f.builder, f.branch, f.rev, f.name FROM refs r JOIN files f ON f.id = r.file WHERE r.chunk = ?'
+        args = []
+        for column, value in (('builder', builder), ('branch', branch), ('name', name)):
+            if value is not None:
+                sql += ' AND f.{} = ?'.format(column)
+                args.append(value)
+        sql += ' ORDER BY f.builder, f.branch, f.rev, f.name'
+
+        found = 0
+        # Whether each file is still in the store
+        present = {}
+        for chunk, digest in self.candidate_chunks(literals):
+            files = self.db.execute(sql, [chunk] + args).fetchall()
+            if not files:
+                continue
+
+            try:
+                data = self.store.read_chunk(digest)
+            except FileNotFoundError:
+                # Reclaimed by the retention policy
+                continue
+
+            lines = [line for line in data.split(b'\n') if compiled.search(line)]
+            for f in files:
+                if f not in present:
+                    present[f] = self.store.exists(*f)
+                if not present[f]:
+                    continue
+                for line in lines:
+                    yield f + (line.decode('utf-8', 'replace'),)
+                    found += 1
+                    if found >= limit:
+                        return
+
+    def prune(self):
+        """Forgets the files no longer in the store, and the chunks they used.
+
+        Returns the number of files forgotten."""
+        gone = [(fileid,) for fileid, b, br, rev, n in self.db.execute('SELECT * FROM files')
+                if not self.store.exists(b, br, rev, n)]
+        with self.db:
+            self.db.executemany('DELETE FROM refs WHERE file = ?', gone)
+            self.db.executemany('DELETE FROM files WHERE id = ?', gone)
+            self.db.execute('DELETE FROM chunks WHERE id NOT IN (SELECT chunk FROM refs)')
+            self.db.execute('DELETE FROM trigrams WHERE chunk NOT IN (SELECT id FROM chunks)')
+        return len(gone)
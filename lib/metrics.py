@@ -0,0 +1,49 @@
+# Metrics of the master, exposed in the Prometheus text format by
+# MetricsService (see lib/gccmetrics.py).
+#
+# The metrics live in the default prometheus_client registry, which
+# also has the metrics of the master process itself (CPU, memory, open
+# files).  Code running in the master records them directly, e.g.:
+#
+#   with SMTP_SEND_SECONDS.time():
+#       s.sendmail(...)
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Most steps take from seconds (master commands) to hours (testsuite)
+DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400, 28800)
+
+# From 1 MB/s to 1 GB/s
+THROUGHPUT_BUCKETS = tuple(2**i * 1024 * 1024 for i in range(0, 11))
+
+BUILDREQUESTS_PENDING = Gauge('gcc_buildbot_buildrequests_pending',
+                              'Build requests waiting for a worker',
+                              ['builder'])
+
+WORKER_CONNECTED = Gauge('gcc_buildbot_worker_connected',
+                         'Whether the worker is connected to the master',
+                         ['worker'])
+
+STEP_DURATION_SECONDS = Histogram('gcc_buildbot_step_duration_seconds',
+                                  'Duration of the finished build steps',
+                                  ['builder', 'step'],
+                                  buckets=DURATION_BUCKETS)
+
+ANALYSIS_DURATION_SECONDS = Histogram('gcc_buildbot_regression_analysis_seconds',
+                                      'Duration of the regression analysis steps',
+                                      ['builder'],
+                                      buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+
+# The mails of the master are sent by DigestService (see lib/digest.py)
+SMTP_SEND_SECONDS = Histogram('gcc_buildbot_smtp_send_seconds',
+                              'Time taken by an SMTP session sending digests',
+                              buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+
+UPLOAD_BYTES = Counter('gcc_buildbot_upload_bytes_total',
+                       'Bytes uploaded from the workers to the master',
+                       ['builder'])
+
+UPLOAD_THROUGHPUT = Histogram('gcc_buildbot_upload_throughput_bytes_per_second',
+                              'Throughput of the uploads from the workers to the master',
+                              ['builder'],
+                              buckets=THROUGHPUT_BUCKETS)
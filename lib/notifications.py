@@ -5,6 +5,7 @@ import socket
 from email.mime.text import MIMEText
 from buildbot.interfaces import IEmailLookup
 from zope.interface import implementer
+from lib.digest import diff_section
 
 def SendRootMessageGCCTesters (branch, change, rev,
                                istrysched = False,
@@ -191,6 +192,12 @@ send to the gcc-testers mailing list."""
 
     for log in build.getLogs ():
         st = log.getStep ()
+        if st.getName () == 'Bisect regression' and log.getName () == 'bisection':
+            text += "*** Bisection of the regressions ***\n"
+            text += "============================\n"
+            text += log.getText ()
+            text += "============================\n"
+            continue
         if st.getResults ()[0] == FAILURE:
             n = st.getName ()
             if 'No space left on device' in log.getText ():
@@ -228,10 +235,7 @@ send to the gcc-testers mailing list."""
                 report_build_breakage = True
                 break
             elif n == 'regressions' and log.getName () == 'regressions':
-                text += "*** Diff to previous build ***\n"
-                text += "============================\n"
-                text += log.getText ()
-                text += "============================\n"
+                text += diff_section (log.getText ())
                 found_regressions = True
                 break
 
@@ -358,10 +362,7 @@ send to the gcc-testers mailing list."""
                 subj = "*** COMPILATION FAILED *** " + subj
                 break
             elif n == 'regressions' and log.getName () == 'regressions':
-                text += "*** Diff to previous build ***\n"
-                text += "============================\n"
-                text += log.getText ()
-                text += "============================\n"
+                text += diff_section (log.getText ())
                 found_regressions = True
                 break
 
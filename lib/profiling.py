@@ -0,0 +1,69 @@
+# Optional profiling of the analysis scripts run by the master.
+#
+# The master decides, for each run, whether the script is profiled
+# (see profiling_mode, switched through MetricsService in
+# lib/gccmetrics.py), so profiling can be turned on and off without a
+# reconfig.  A profiled run leaves, in the profile directory:
+#
+#  - with cprofile: <name>.prof, to be read with pstats or snakeviz;
+#  - with tracemalloc: <name>.txt, the lines allocating the most memory
+#    still allocated at the end of the run, and the peak.
+
+import cProfile
+import os
+import tracemalloc
+from contextlib import contextmanager
+
+PROFILING_MODES = ['off', 'cprofile', 'tracemalloc']
+
+# Number of allocation sites listed by tracemalloc profiles
+TRACEMALLOC_TOP = 50
+
+
+@contextmanager
+def profiled(mode, directory, name):
+    """Profiles the body of the with statement according to mode, one of
+    PROFILING_MODES, writing the profile as directory/name.<ext>."""
+    if mode == 'off':
+        yield
+        return
+    if mode not in PROFILING_MODES:
+        raise ValueError('Unknown profiling mode {}'.format(mode))
+
+    os.makedirs(directory, exist_ok=True)
+    if mode == 'cprofile':
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(os.path.join(directory, '{}.prof'.format(name)))
+    else:
+        tracemalloc.start(10)
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(os.path.join(directory, '{}.txt'.format(name)), 'w') as f:
+                f.write('Peak traced memory: {} bytes\n\n'.format(peak))
+                for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                    f.write('{}\n'.format(stat))
+
+
+# Mode the master runs the analysis scripts with, switched at runtime
+# through MetricsService
+_mode = 'off'
+
+
+def profiling_mode():
+    return _mode
+
+
+def set_profiling_mode(mode):
+    global _mode  # pylint: disable=global-statement
+    if mode not in PROFILING_MODES:
+        raise ValueError('Unknown profiling mode {}'.format(mode))
+    _mode = mode
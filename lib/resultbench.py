@@ -0,0 +1,202 @@
+# Benchmarks of the processing of test results on the master.
+#
+# Synthetic DejaGnu .sum and .log files, of any number of tests, are
+# generated from a seed, so that runs on different machines and at
+# different times process the same input.  Each stage of the
+# processing (parsing, TestRun discovery, comparison, notification
+# rendering) is then timed, and its peak memory measured with
+# tracemalloc in a separate run, tracing slowing Python down.
+#
+# Only the standard library is needed.
+
+import os
+import platform
+import random
+import time
+import tracemalloc
+
+from lib.dejagnu import SumFile, LogFile, TestRun, find_regressions
+from lib.digest import render_digest, make_mail
+
+# Bump when the stages or the generated files change, results of
+# different versions cannot be compared
+BENCH_VERSION = 2
+
+# (directory, driver, variants of each test file)
+SYNTHETIC_EXPS = [
+    ('gcc.dg', 'dg.exp', ['(test for excess errors)']),
+    ('gcc.dg/torture', 'dg-torture.exp',
+     ['{} (test for excess errors)'.format(opt) for opt in ['-O0', '-O1', '-O2', '-O3', '-Os']]),
+    ('gcc.c-torture/execute', 'execute.exp',
+     ['{} {}'.format(opt, kind) for opt in ['-O0', '-O1', '-O2', '-O3 -g', '-Os']
+      for kind in ['(test for excess errors)', 'execution test']]),
+    ('gcc.target/i386', 'i386.exp', ['(test for excess errors)', 'scan-assembler vmovdqa']),
+]
+
+# Outcomes of the generated tests, and their frequency
+SYNTHETIC_OUTCOMES = [('PASS', 0.95), ('UNSUPPORTED', 0.03), ('XFAIL', 0.015),
+                      ('FAIL', 0.003), ('UNRESOLVED', 0.001), ('XPASS', 0.001)]
+
+# Fraction of the tests of the "after" run changing to FAIL
+REGRESSION_RATE = 0.001
+
+
+def synthetic_tests(ntests, seed=0, regression_rate=0.0):
+    """Yields (exp directory, exp, testname, outcome) for ntests tests.
+
+    The same seed gives the same tests and outcomes; regression_rate
+    of them are then turned into FAILs."""
+    rng = random.Random(seed)
+    outcomes = [outcome for outcome, _ in SYNTHETIC_OUTCOMES]
+    cumulative = []
+    total = 0.0
+    for _, frequency in SYNTHETIC_OUTCOMES:
+        total += frequency
+        cumulative.append(total)
+    # Regressions are drawn independently, to keep the outcomes of the
+    # other tests the same as in the "before" run
+    regressions = random.Random(seed + 1)
+
+    for i, (directory, exp, variants) in enumerate(SYNTHETIC_EXPS):
+        # As in real runs, the tests of each driver come together
+        quota = ntests // len(SYNTHETIC_EXPS) + (i < ntests % len(SYNTHETIC_EXPS))
+        count = 0
+        number = 0
+        while count < quota:
+            number += 1
+            for variant in variants[:quota - count]:
+                draw = rng.random() * total
+                outcome = next(o for o, c in zip(outcomes, cumulative) if draw < c)
+                if regression_rate and regressions.random() < regression_rate:
+                    outcome = 'FAIL'
+                yield (directory, exp,
+                       '{}/pr{}.c {}'.format(directory, number, variant), outcome)
+                count += 1
+
+
+def generate(directory, ntests, seed=0, regression_rate=0.0):
+    """Writes directory/gcc.sum and directory/gcc.log with ntests tests.
+
+    Returns the path of the .sum file."""
+    os.makedirs(directory, exist_ok=True)
+    sumpath = os.path.join(directory, 'gcc.sum')
+    logpath = os.path.join(directory, 'gcc.log')
+    header = ('Test Run By gcc-buildbot on Thu Jan  1 00:00:00 1970\n'
+              'Native configuration is x86_64-pc-linux-gnu\n\n'
+              '\t\t=== gcc tests ===\n\n'
+              'Schedule of variations:\n    unix\n\n'
+              'Running target unix\n')
+    counts = {}
+    with open(sumpath, 'w') as sumfile, open(logpath, 'w') as logfile:
+        sumfile.write(header)
+        logfile.write(header)
+        current = None
+        for testdir, exp, testname, outcome in synthetic_tests(ntests, seed, regression_rate):
+            if exp != current:
+                running = 'Running /src/gcc/testsuite/{}/{} ...\n'.format(testdir, exp)
+                sumfile.write(running)
+                logfile.write(running)
+                current = exp
+            source = testname.split()[0]
+            logfile.write('Executing on host: /build/gcc/xgcc -B/build/gcc/ '
+                          '/src/gcc/testsuite/{} -fdiagnostics-color=never -S -o {}.s'
+                          '    (timeout = 300)\n'.format(source, os.path.basename(source)))
+            logfile.write('spawn -ignore SIGHUP /build/gcc/xgcc -B/build/gcc/ '
+                          '/src/gcc/testsuite/{}\n'.format(source))
+            if outcome in ('FAIL', 'UNRESOLVED'):
+                logfile.write('/src/gcc/testsuite/{}:12:3: error: expected expression\n'
+                              'compiler exited with status 1\n'.format(source))
+            line = '{}: {}\n'.format(outcome, testname)
+            sumfile.write(line)
+            logfile.write(line)
+            counts[outcome] = counts.get(outcome, 0) + 1
+        footer = '\n\t\t=== gcc Summary ===\n\n' + ''.join(
+            '# of {}\t\t{}\n'.format(outcome, count) for outcome, count in sorted(counts.items()))
+        sumfile.write(footer)
+        logfile.write(footer)
+    return sumpath
+
+
+def measure(function, repeat=3, memory=True):
+    """Returns the wall time in seconds of the fastest of repeat calls
+    of function, and the peak memory in bytes it allocates, if asked."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    result = {'wall': min(times), 'peak': None}
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            result['peak'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def render_regressions(regressions):
+    """Returns the digest mail of a build with regressions, as composed
+    and sent by DigestService (see lib/digest.py)."""
+    build = {'builder': 'bench', 'results': 'warnings', 'url': None,
+             'regressions': {'gcc': (0, [{'test': test, 'before': before, 'after': after}
+                                         for test, before, after in regressions])}}
+    change = {'author': 'gcc-buildbot', 'comments': 'Benchmark\n'}
+    subject, text = render_digest('trunk', 1, change, [build], set(), {}, 3600)
+    return make_mail(subject, text, 'from@localhost', 'to@localhost', '<1-digest@bench>').as_string()
+
+
+def run_size(workdir, ntests, seed=0, repeat=3, memory=True):
+    """Runs every stage on ntests generated tests, in workdir.
+
+    Returns a dictionary from stage to measure; a stage failing is
+    reported with its error instead."""
+    start = time.perf_counter()
+    beforepath = generate(os.path.join(workdir, 'before'), ntests, seed)
+    afterpath = generate(os.path.join(workdir, 'after'), ntests, seed, REGRESSION_RATE)
+    stages = {'generate': {'wall': time.perf_counter() - start, 'peak': None,
+                           'bytes': os.path.getsize(afterpath)
+                                    + os.path.getsize(os.path.splitext(afterpath)[0] + '.log')}}
+
+    before = SumFile(beforepath)
+    after = SumFile(afterpath)
+    regressions = find_regressions(before, after)
+    for stage, function in [('parse-sum', lambda: SumFile(afterpath)),
+                            ('parse-log', lambda: LogFile(os.path.splitext(afterpath)[0] + '.log')),
+                            ('testrun', lambda: TestRun(os.path.dirname(afterpath)).sumfiles),
+                            ('compare', lambda: find_regressions(before, after)),
+                            ('render', lambda: render_regressions(regressions))]:
+        try:
+            stages[stage] = measure(function, repeat, memory)
+        except Exception as e:  # pylint: disable=broad-except
+            stages[stage] = {'error': '{}: {}'.format(type(e).__name__, e)}
+    stages['compare']['regressions'] = len(regressions)
+    return stages
+
+
+def machine():
+    """Returns a description of the machine running the benchmarks."""
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()}
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """Returns the list of the stages of current slower, or using more
+    memory, than in baseline by more than threshold, as
+    (size, stage, metric, baseline value, current value) tuples."""
+    if baseline.get('version') != current.get('version'):
+        raise ValueError('Cannot compare benchmarks of versions {} and {}'
+                         .format(baseline.get('version'), current.get('version')))
+
+    slower = []
+    for size, stages in sorted(current['sizes'].items(), key=lambda item: int(item[0])):
+        for stage, result in sorted(stages.items()):
+            previous = baseline['sizes'].get(size, {}).get(stage, {})
+            for metric in ['wall', 'peak']:
+                if result.get(metric) and previous.get(metric) \
+                   and result[metric] > previous[metric] * (1 + threshold):
+                    slower.append((int(size), stage, metric, previous[metric], result[metric]))
+    return slower
@@ -0,0 +1,159 @@
+# Tiered retention and compaction of the results data directory.
+#
+# The artifact store (see lib/artifactstore.py) keeps the test results
+# of every revision.  The retention policy applies, for each builder
+# and branch, the following rules:
+#
+#  - the full .log files are only kept for the last keep_logs revisions;
+#  - the .sum files and compact parsed results (<lang>.results.json)
+#    are kept forever;
+#  - revisions older than archive_after days, and older than the last
+#    keep_logs revisions, are packed into per-month archives.
+#
+# The work is done incrementally: a run stops as soon as it has read
+# and written about budget bytes, manifests and archive indexes
+# included, and the next run continues from where it stopped since
+# every operation is idempotent.  The revisions whose logs were already
+# dropped are remembered (in <store>/retention.json), and the scan for
+# revisions to archive stops at the first one too young, so a run does
+# not go through the revisions with nothing to do.
+#
+# The chunks of the removed .log files are only reclaimed by the
+# garbage collection of the store (see ArtifactStore.gc), which has to
+# read every manifest and cannot be split that way: it is run on its
+# own, much less often (see scripts/data-retention.py --gc).
+
+import json
+import logging as log
+import os
+import time
+from collections import OrderedDict
+
+from lib.artifactstore import write_atomically
+from lib.dejagnu import SumFile
+
+LOG_SUFFIX = '.log'
+SUM_SUFFIX = '.sum'
+RESULTS_SUFFIX = '.results.json'
+
+
+class RetentionPolicy:
+    """
+    Applies the retention rules to an ArtifactStore.
+    """
+    def __init__(self, store, keep_logs=50, archive_after=90,
+                 budget=64 * 1024 * 1024):
+        self.store = store
+        self.keep_logs = keep_logs
+        self.archive_after = archive_after * 24 * 3600
+        self.budget = budget
+        # Bytes read and written during the current run
+        self.cost = 0
+        self.metadata_read = store.metadata_read
+        self.state_path = os.path.join(store.root, 'retention.json')
+
+    def count_metadata(self):
+        """Adds the manifests and archive indexes read so far to the cost."""
+        self.cost += self.store.metadata_read - self.metadata_read
+        self.metadata_read = self.store.metadata_read
+
+    def exhausted(self):
+        self.count_metadata()
+        return self.cost >= self.budget
+
+    def load_state(self):
+        """Returns the dictionary from 'builder/branch' to the last
+        revision whose logs were dropped."""
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def store_results(self, builder, branch, rev, lang):
+        """Stores the compact parsed results of lang, unless already there."""
+        name = lang + RESULTS_SUFFIX
+        if self.store.exists(builder, branch, rev, name) \
+           or not self.store.exists(builder, branch, rev, lang + SUM_SUFFIX):
+            return
+
+        with self.store.open(builder, branch, rev, lang + SUM_SUFFIX, 'r') as f:
+            sumfile = SumFile('r{}/{}{}'.format(rev, lang, SUM_SUFFIX), f)
+        data = json.dumps(sumfile.to_results()).encode('utf-8')
+        self.store.put(builder, branch, rev, name, [data])
+
+        self.cost += self.store.manifest(builder, branch, rev, lang + SUM_SUFFIX)['size']
+        self.cost += len(data)
+
+    def drop_logs(self, builder, branch, rev):
+        """Removes the .log files of rev, keeping parsed results.
+
+        Returns the number of files removed."""
+        removed = 0
+        for name in self.store.loose_files(builder, branch, rev):
+            if not name.endswith(LOG_SUFFIX):
+                continue
+
+            lang = name[:-len(LOG_SUFFIX)]
+            self.store_results(builder, branch, rev, lang)
+            self.store.remove(builder, branch, rev, name)
+            log.info('%s/%s: removed %s of r%d', builder, branch, name, rev)
+            removed += 1
+        return removed
+
+    def archivable(self, builder, branch, revisions):
+        """Returns {month: [revision, ...]} for the revisions, in
+        increasing order, old enough to be archived, and whether all of
+        them were considered.  Stops at the first revision too young,
+        the next ones being younger, or when out of budget."""
+        months = OrderedDict()
+        for rev in revisions:
+            stored = self.store.stored_time(builder, branch, rev)
+            if stored is None:
+                continue
+            if time.time() - stored < self.archive_after:
+                break
+            months.setdefault(time.strftime('%Y-%m', time.localtime(stored)), []).append(rev)
+            if self.exhausted():
+                return months, False
+        return months, True
+
+    def run(self):
+        """Applies the retention rules until done or out of budget.
+
+        Returns True if all the work has been done."""
+        self.cost = 0
+        state = self.load_state()
+        done = True
+
+        for builder, branch in self.store.series():
+            if not done or self.exhausted():
+                done = False
+                break
+
+            # Archived revisions are older than the loose ones
+            loose = self.store.loose_revisions(builder, branch)
+            old = loose[:-self.keep_logs] if self.keep_logs else loose
+
+            key = '{}/{}'.format(builder, branch)
+            for rev in old:
+                if rev <= state.get(key, 0):
+                    continue
+                self.drop_logs(builder, branch, rev)
+                state[key] = rev
+                if self.exhausted():
+                    done = False
+                    break
+
+            # Only the revisions without logs any more are archived
+            months, done_archiving = self.archivable(
+                builder, branch, [rev for rev in old if rev <= state.get(key, 0)])
+            for month, revisions in months.items():
+                self.cost += self.store.archive(builder, branch, revisions, month)
+                log.info('%s/%s: archived r%d to r%d into %s', builder, branch,
+                         revisions[0], revisions[-1], month)
+            done = done and done_archiving
+
+        write_atomically(self.state_path, json.dumps(state, sort_keys=True).encode('utf-8'))
+        self.count_metadata()
+        return done
@@ -0,0 +1,65 @@
+# Resource telemetry of the workers (see scripts/resource-monitor).
+#
+# Workers sample their load, available memory and free disk space while
+# GCC is compiled and tested; the samples are stored with the test
+# results, as telemetry.jsonl, one JSON object per line.  Regressions
+# found in a run during which the worker was short of resources are
+# likely caused by it (timeouts, killed compilers, full disks) rather
+# than by the tested revision.
+
+import json
+
+TELEMETRY_VERSION = 1
+
+TELEMETRY_NAME = 'telemetry.jsonl'
+
+# Thresholds of resource pressure
+MIN_MEM_AVAILABLE_FRACTION = 0.05
+MAX_LOAD_PER_CPU = 2.0
+MIN_DISK_FREE = 1024 * 1024 * 1024
+
+
+def load_samples(lines):
+    """Returns the samples of the lines of a telemetry file, skipping
+    the ones of other versions or truncated."""
+    samples = []
+    for line in lines:
+        try:
+            sample = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(sample, dict) and sample.get('version') == TELEMETRY_VERSION:
+            samples.append(sample)
+    return samples
+
+
+def resource_pressure(samples, phase='test'):
+    """Returns a JSON serializable description of the resource pressure
+    the worker was under during phase, or None if there was none."""
+    samples = [sample for sample in samples if sample['phase'] == phase]
+    if not samples:
+        return None
+
+    reasons = []
+    low_memory = [sample for sample in samples
+                  if sample['mem_available'] < sample['mem_total'] * MIN_MEM_AVAILABLE_FRACTION]
+    if low_memory:
+        reasons.append('available memory down to {} MiB'
+                       .format(min(sample['mem_available'] for sample in low_memory) // 2**20))
+    overloaded = [sample for sample in samples
+                  if sample['load1'] > sample['cpus'] * MAX_LOAD_PER_CPU]
+    if overloaded:
+        reasons.append('load up to {:.1f} on {} CPUs'
+                       .format(max(sample['load1'] for sample in overloaded),
+                               overloaded[0]['cpus']))
+    low_disk = [sample for sample in samples if sample['disk_free'] < MIN_DISK_FREE]
+    if low_disk:
+        reasons.append('free disk space down to {} MiB'
+                       .format(min(sample['disk_free'] for sample in low_disk) // 2**20))
+    if not reasons:
+        return None
+
+    return {'phase': phase,
+            'samples': len(samples),
+            'pressured_samples': len({id(sample) for sample in low_memory + overloaded + low_disk}),
+            'reasons': reasons}
@@ -0,0 +1,189 @@
+# Per-test history of outcomes, backed by an inverted index.
+#
+# For every (builder, branch, lang) series the index records, for
+# each test, the revisions at which its outcome changed.  Only
+# transitions are stored, so the index grows with the number of
+# outcome changes rather than with the number of revisions times the
+# number of tests, and answering "when did this test start failing?"
+# is a single index lookup that never touches the result files.
+#
+# A test that disappears from a run is recorded with the ABSENT
+# outcome.  Revisions of a series are usually ingested in increasing
+# order; an older one (e.g. of a build which finished late) is
+# inserted between the ingested revisions, and the transitions of the
+# next ingested revision are fixed accordingly.
+
+import sqlite3
+
+ABSENT = 'ABSENT'
+
+# Number of test names looked up per query (SQLite limits the number
+# of parameters of a statement)
+LOOKUP_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    builder TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    last_rev INTEGER,
+    UNIQUE (builder, branch, lang));
+CREATE TABLE IF NOT EXISTS tests (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS runs (
+    series INTEGER NOT NULL,
+    rev INTEGER NOT NULL,
+    PRIMARY KEY (series, rev)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS state (
+    series INTEGER NOT NULL,
+    test INTEGER NOT NULL,
+    outcome TEXT NOT NULL,
+    PRIMARY KEY (series, test)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS transitions (
+    test INTEGER NOT NULL,
+    series INTEGER NOT NULL,
+    rev INTEGER NOT NULL,
+    outcome TEXT NOT NULL,
+    PRIMARY KEY (test, series, rev)) WITHOUT ROWID;
+"""
+
+
+class TestHistory:
+    """
+    Inverted index from test name to its outcome transitions.
+    """
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def series_id(self, builder, branch, lang, create=False):
+        row = self.db.execute('SELECT id FROM series WHERE builder = ? AND branch = ? AND lang = ?',
+                              (builder, branch, lang)).fetchone()
+        if row:
+            return row[0]
+        if not create:
+            return None
+        return self.db.execute('INSERT INTO series (builder, branch, lang) VALUES (?, ?, ?)',
+                               (builder, branch, lang)).lastrowid
+
+    def test_ids(self, names):
+        """Returns a dictionary from test name to id, creating missing tests."""
+        names = list(names)
+        self.db.executemany('INSERT OR IGNORE INTO tests (name) VALUES (?)',
+                            ((name,) for name in names))
+        ids = {}
+        for i in range(0, len(names), LOOKUP_BATCH):
+            batch = names[i:i + LOOKUP_BATCH]
+            sql = 'SELECT name, id FROM tests WHERE name IN ({})'.format(','.join('?' * len(batch)))
+            ids.update(self.db.execute(sql, batch))
+        return ids
+
+    def outcomes_at(self, series, rev):
+        """Returns a dictionary from test id to its outcome at rev, for the
+        tests with a transition at or before rev."""
+        return dict(self.db.execute(
+            'SELECT test, outcome FROM transitions t WHERE series = ? AND rev = '
+            '(SELECT MAX(rev) FROM transitions WHERE test = t.test AND series = t.series AND rev <= ?)',
+            (series, rev)))
+
+    def ingest(self, builder, branch, lang, rev, testname_to_outcome):
+        """Records the outcomes of revision rev.
+
+        Returns the number of transitions recorded at rev.  Raises
+        ValueError if rev was already ingested."""
+        with self.db:
+            series = self.series_id(builder, branch, lang, create=True)
+            if self.db.execute('SELECT 1 FROM runs WHERE series = ? AND rev = ?',
+                               (series, rev)).fetchone():
+                raise ValueError('r{} of {}/{}/{} is already indexed'.format(rev, builder, branch, lang))
+            last_rev = self.db.execute('SELECT last_rev FROM series WHERE id = ?',
+                                       (series,)).fetchone()[0]
+            newest = last_rev is None or rev > last_rev
+
+            ids = self.test_ids(testname_to_outcome.keys())
+            if newest:
+                previous = dict(self.db.execute('SELECT test, outcome FROM state WHERE series = ?',
+                                                (series,)))
+            else:
+                previous = self.outcomes_at(series, rev - 1)
+
+            current = {ids[name]: outcome for name, outcome in testname_to_outcome.items()}
+            for test, outcome in previous.items():
+                if test not in current and outcome != ABSENT:
+                    current[test] = ABSENT
+
+            changed = [(test, outcome) for test, outcome in current.items()
+                       if previous.get(test) != outcome]
+
+            self.db.executemany('INSERT INTO transitions (test, series, rev, outcome) VALUES (?, ?, ?, ?)',
+                                ((test, series, rev, outcome) for test, outcome in changed))
+            if newest:
+                self.db.executemany('INSERT OR REPLACE INTO state (series, test, outcome) VALUES (?, ?, ?)',
+                                    ((series, test, outcome) for test, outcome in changed))
+                self.db.execute('UPDATE series SET last_rev = ? WHERE id = ?', (rev, series))
+            else:
+                self.fix_next(series, rev, previous, changed)
+            self.db.execute('INSERT INTO runs (series, rev) VALUES (?, ?)', (series, rev))
+
+        return len(changed)
+
+    def fix_next(self, series, rev, previous, changed):
+        """Fixes the transitions of the revision ingested after rev, which
+        was compared with the outcomes previous of the revision before
+        rev when it was ingested, for the tests whose outcome changed
+        at rev."""
+        following = self.db.execute('SELECT MIN(rev) FROM runs WHERE series = ? AND rev > ?',
+                                    (series, rev)).fetchone()[0]
+        at_following = dict(self.db.execute('SELECT test, outcome FROM transitions '
+                                            'WHERE series = ? AND rev = ?', (series, following)))
+        for test, outcome in changed:
+            if test in at_following:
+                # The test changed at following, maybe no longer
+                if at_following[test] == outcome:
+                    self.db.execute('DELETE FROM transitions WHERE test = ? AND series = ? AND rev = ?',
+                                    (test, series, following))
+            else:
+                # The test had the same outcome at following as before rev
+                self.db.execute('INSERT INTO transitions (test, series, rev, outcome) VALUES (?, ?, ?, ?)',
+                                (test, series, following, previous.get(test, ABSENT)))
+
+    def query(self, testname, builder=None, branch=None, lang=None):
+        """Returns the history of testname, as a JSON serializable list.
+
+        Each element describes one series, with its transitions.  Every
+        transition also gives the previous tested revision, i.e. the last
+        one with the former outcome."""
+        sql = ('SELECT s.id, s.builder, s.branch, s.lang, t.rev, t.outcome '
+               'FROM transitions t JOIN series s ON s.id = t.series '
+               'WHERE t.test = (SELECT id FROM tests WHERE name = ?)')
+        args = [testname]
+        for column, value in (('builder', builder), ('branch', branch), ('lang', lang)):
+            if value is not None:
+                sql += ' AND s.{} = ?'.format(column)
+                args.append(value)
+        sql += ' ORDER BY s.builder, s.branch, s.lang, t.rev'
+
+        history = []
+        by_series = {}
+        for series, b, br, l, rev, outcome in self.db.execute(sql, args):
+            if series not in by_series:
+                by_series[series] = {'builder': b, 'branch': br, 'lang': l,
+                                     'transitions': []}
+                history.append(by_series[series])
+
+            prev = self.db.execute('SELECT MAX(rev) FROM runs WHERE series = ? AND rev < ?',
+                                   (series, rev)).fetchone()[0]
+            by_series[series]['transitions'].append({'rev': rev,
+                                                     'outcome': outcome,
+                                                     'previous_rev': prev})
+        return history
+
+    def search(self, pattern, limit=100):
+        """Returns at most limit test names matching the SQL LIKE pattern."""
+        return [name for name, in self.db.execute('SELECT name FROM tests WHERE name LIKE ? LIMIT ?',
+                                                  (pattern, limit))]
@@ -0,0 +1,133 @@
+# Time-budgeted test profiles.
+#
+# A test profile selects which DejaGnu drivers (.exp files) a build
+# runs, through RUNTESTFLAGS, so that the testsuite fits in a time
+# budget.  The selection uses the statistics of previous builds of the
+# same builder:
+#
+#  - the duration of every driver, measured on the worker by
+#    scripts/runtest-wrapper (summed over all tools and parallel
+#    instances of runtest);
+#  - the failure-detection value of every driver, i.e. the number of
+#    regressions it found (see <lang>.regressions.json in the artifact
+#    store).
+#
+# Drivers are taken by decreasing value per second, the ones the
+# profile includes first, until the budget is spent.  Without
+# statistics (a new builder) the whole testsuite is run, which collects
+# them.
+
+import json
+import os
+
+from lib.artifactstore import write_atomically
+
+# Weight of the latest build in the average duration of a driver
+DURATION_WEIGHT = 0.3
+
+
+class TestProfile:
+    """
+    A named test tier.  budget is the wall time, in seconds, the
+    testsuite may take, or None to run everything.  The drivers in
+    exclude are never run, those in include are taken first, as long
+    as they fit in the budget too.
+    """
+    def __init__(self, name, budget=None, exclude=(), include=()):
+        self.name = name
+        self.budget = budget
+        self.exclude = set(exclude)
+        self.include = set(include)
+
+
+PROFILES = {p.name: p for p in [
+    # Per commit, on the incremental builders
+    TestProfile('smoke', budget=45 * 60,
+                exclude=['guality.exp', 'prettyprinters.exp'],
+                include=['dg.exp', 'execute.exp']),
+    # What the former 'fast' patch did, disabling the slow guality and
+    # pretty-printers tests
+    TestProfile('fast', budget=20 * 60,
+                exclude=['guality.exp', 'prettyprinters.exp']),
+    # Everything, on the DailyBump builders
+    TestProfile('full'),
+]}
+
+
+class TestStats:
+    """
+    Per-driver duration and failure-detection statistics of a builder,
+    kept in a JSON file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.exps = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.exps = json.load(f)['exps']
+
+    def save(self):
+        data = json.dumps({'version': 1, 'exps': self.exps}, indent=1, sort_keys=True)
+        write_atomically(self.path, data.encode('utf-8'))
+
+    def update(self, durations, regressions):
+        """Records the results of a build.
+
+        durations is a dictionary from driver to seconds, regressions a
+        dictionary from driver to the number of regressions it found."""
+        for exp, seconds in durations.items():
+            stats = self.exps.setdefault(exp, {'duration': seconds, 'runs': 0, 'regressions': 0})
+            stats['duration'] += DURATION_WEIGHT * (seconds - stats['duration'])
+            stats['runs'] += 1
+        for exp, count in regressions.items():
+            if exp in self.exps:
+                self.exps[exp]['regressions'] += count
+
+    def value(self, exp):
+        """Returns the failure-detection value of exp per second."""
+        stats = self.exps[exp]
+        # Smoothed, so that drivers which never found anything yet keep
+        # some value, decreasing as they keep finding nothing
+        found = (stats['regressions'] + 1) / (stats['runs'] + 2)
+        return found / max(stats['duration'], 1.0)
+
+    def select(self, profile, jobs=1):
+        """Returns the sorted list of drivers to run for profile, or None
+        to run the whole testsuite.
+
+        jobs is the number of tests run in parallel, since the durations
+        add up the time spent by every instance of runtest."""
+        if profile.budget is None and not profile.exclude:
+            return None
+        if not self.exps:
+            return None
+
+        candidates = [exp for exp in self.exps if exp not in profile.exclude]
+        if profile.budget is None:
+            return sorted(candidates)
+
+        budget = profile.budget * jobs
+        selected = []
+        spent = 0.0
+
+        for exp in sorted(candidates, key=lambda exp: (exp in profile.include, self.value(exp)),
+                          reverse=True):
+            duration = self.exps[exp]['duration']
+            if spent + duration <= budget:
+                selected.append(exp)
+                spent += duration
+        return sorted(selected)
+
+
+def read_durations(path):
+    """Returns the total duration of each driver in a file written by
+    scripts/runtest-wrapper."""
+    durations = {}
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) != 3:
+                continue
+            _, exp, seconds = fields
+            durations[exp] = durations.get(exp, 0.0) + float(seconds)
+    return durations
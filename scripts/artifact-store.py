@@ -0,0 +1,111 @@
+#! /usr/bin/env python3
+
+# This script gives access to the content-addressed artifact store of
+# GCC buildbot (see lib/artifactstore.py).
+
+# Available commands:
+
+# ingest --store <path> --builder <string> --branch <string> [--remove] COMMIT TARBALL
+# Stores every .sum.xz and .log.xz member of TARBALL (as uploaded by the
+# workers) decompressed, as <lang>.sum and <lang>.log of COMMIT.
+# cat --store <path> --builder <string> --branch <string> COMMIT NAME
+# Streams a stored file to the standard output.
+# ls --store <path> --builder <string> --branch <string> [COMMIT]
+# Lists the stored revisions, or the files of a revision.
+# gc --store <path>
+# Removes chunks no longer referenced by any file.
+
+import logging as log
+import lzma
+import os
+import shutil
+import sys
+import tarfile
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lib.artifactstore import ArtifactStore  # pylint: disable=wrong-import-position
+
+log.basicConfig(level=log.DEBUG)
+
+# Compressed members of uploaded tarballs we know how to store
+COMPRESSED_SUFFIX = '.xz'
+
+
+@click.group()
+def cli():
+    """Content-addressed store of GCC test artifacts."""
+    pass
+
+
+@cli.command()
+@click.option('--store', 'store_dir')
+@click.option('--builder')
+@click.option('--branch')
+@click.option('--remove', is_flag=True, help='Remove TARBALL once stored')
+@click.argument('commit', type=int)
+@click.argument('tarball')
+def ingest(store_dir: str, builder: str, branch: str, remove: bool,
+           commit: int, tarball: str) -> int:
+    """Stores the test results of TARBALL in the artifact store."""
+    store = ArtifactStore(store_dir)
+
+    with tarfile.open(tarball) as tar:
+        for member in tar:
+            if not member.isfile() or not member.name.endswith(COMPRESSED_SUFFIX):
+                continue
+
+            name = os.path.basename(member.name)[:-len(COMPRESSED_SUFFIX)]
+            with lzma.open(tar.extractfile(member)) as f:
+                manifest = store.put(builder, branch, commit, name, f)
+            log.info('Stored %s (%d bytes, %d chunks)', name,
+                     manifest['size'], len(manifest['chunks']))
+
+    if remove:
+        os.remove(tarball)
+    return 0
+
+
+@cli.command()
+@click.option('--store', 'store_dir')
+@click.option('--builder')
+@click.option('--branch')
+@click.argument('commit', type=int)
+@click.argument('name')
+def cat(store_dir: str, builder: str, branch: str, commit: int, name: str) -> int:
+    """Streams a stored file to the standard output."""
+    store = ArtifactStore(store_dir)
+    with store.open(builder, branch, commit, name) as f:
+        shutil.copyfileobj(f, sys.stdout.buffer)
+    return 0
+
+
+@cli.command('ls')
+@click.option('--store', 'store_dir')
+@click.option('--builder')
+@click.option('--branch')
+@click.argument('commit', type=int, required=False)
+def list_files(store_dir: str, builder: str, branch: str, commit: int) -> int:
+    """Lists the stored revisions, or the files stored for COMMIT."""
+    store = ArtifactStore(store_dir)
+    if commit is None:
+        for rev in store.revisions(builder, branch):
+            print('r{}'.format(rev))
+    else:
+        for name in store.files(builder, branch, commit):
+            print(name)
+    return 0
+
+
+@cli.command()
+@click.option('--store', 'store_dir')
+def gc(store_dir: str) -> int:
+    """Removes chunks no longer referenced by any stored file."""
+    freed = ArtifactStore(store_dir).gc()
+    log.info('Freed %d bytes', freed)
+    return 0
+
+if __name__ == '__main__':
+    # pylint: disable=no-value-for-parameter,unexpected-keyword-arg
+    sys.exit(cli(standalone_mode=False))
@@ -0,0 +1,109 @@
+#! /usr/bin/env python3
+
+# This script benchmarks the processing of test results by GCC buildbot
+# (see lib/resultbench.py) on synthetic DejaGnu files, and checks the
+# results for slowdowns.  It runs offline.
+
+# Available commands:
+
+# run [--size <n>]... [--seed <n>] [--repeat <n>] [--no-memory]
+#     [--work-dir <path>] [--output-dir <path>]
+# Times each stage, and measures its peak memory, for every size
+# (10k to 1M tests by default, up to 5M is supported), and stores the
+# results in <output-dir>/<date>.json.
+# compare [--threshold <fraction>] BASELINE CURRENT
+# Lists the stages of the CURRENT results slower, or using more memory,
+# than in the BASELINE ones by more than threshold (default 10%).
+# Returns 1 if there is any.
+
+import datetime
+import json
+import logging as log
+import os
+import shutil
+import sys
+import tempfile
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lib.resultbench import BENCH_VERSION, run_size, machine, compare_results  # pylint: disable=wrong-import-position
+
+log.basicConfig(level=log.INFO)
+
+
+@click.group()
+def cli():
+    """Benchmarks of the processing of test results."""
+    pass
+
+
+@cli.command()
+@click.option('--size', type=int, multiple=True)
+@click.option('--seed', type=int, default=0)
+@click.option('--repeat', type=int, default=3)
+@click.option('--no-memory', is_flag=True)
+@click.option('--work-dir', default=None)
+@click.option('--output-dir', default='/home/gcc-buildbot/data/bench')
+def run(size: tuple, seed: int, repeat: int, no_memory: bool, work_dir: str,
+        output_dir: str) -> int:
+    """Runs the benchmarks and stores their results."""
+    results = {'version': BENCH_VERSION,
+               'date': datetime.datetime.utcnow().isoformat(),
+               'machine': machine(),
+               'seed': seed,
+               'sizes': {}}
+
+    workdir = tempfile.mkdtemp(prefix='bench-results-', dir=work_dir)
+    try:
+        for ntests in size or [10000, 100000, 1000000]:
+            log.info('Benchmarking %d tests', ntests)
+            stages = run_size(os.path.join(workdir, str(ntests)), ntests, seed, repeat,
+                              not no_memory)
+            for stage, result in sorted(stages.items()):
+                if 'error' in result:
+                    log.warning('  %s failed: %s', stage, result['error'])
+                else:
+                    log.info('  %s: %.3fs%s', stage, result['wall'],
+                             ', peak {:.1f} MiB'.format(result['peak'] / 2**20)
+                             if result['peak'] is not None else '')
+            results['sizes'][str(ntests)] = stages
+            shutil.rmtree(os.path.join(workdir, str(ntests)))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, '{}.json'.format(results['date'].replace(':', '')))
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    log.info('Results stored in %s', path)
+    return 0
+
+
+@cli.command()
+@click.option('--threshold', type=float, default=0.1)
+@click.argument('baseline', type=click.Path(exists=True))
+@click.argument('current', type=click.Path(exists=True))
+def compare(threshold: float, baseline: str, current: str) -> int:
+    """Lists the stages slower in CURRENT than in BASELINE."""
+    with open(baseline) as f:
+        baseline_results = json.load(f)
+    with open(current) as f:
+        current_results = json.load(f)
+
+    try:
+        slower = compare_results(baseline_results, current_results, threshold)
+    except ValueError as e:
+        log.error('%s', e)
+        return 2
+
+    for ntests, stage, metric, before, after in slower:
+        log.warning('%d tests, %s: %s went from %s to %s (%+.1f%%)', ntests, stage, metric,
+                    before, after, (after / before - 1) * 100)
+    if not slower:
+        log.info('No slowdown over %.0f%%', threshold * 100)
+    return 1 if slower else 0
+
+if __name__ == '__main__':
+    # pylint: disable=no-value-for-parameter,unexpected-keyword-arg
+    sys.exit(cli(standalone_mode=False))
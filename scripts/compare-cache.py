@@ -0,0 +1,53 @@
+#! /usr/bin/env python3
+
+# This script inspects the cache of comparison results of GCC buildbot
+# (see lib/comparecache.py).
+
+# Available commands:
+
+# stats --cache-dir <path>
+# Prints, as JSON, the hit and miss counts, the hit rate and the size
+# of the cache.
+# evict --cache-dir <path> [--max-size <bytes>]
+# Removes the least recently used entries until the cache fits in
+# max-size bytes.
+
+import json
+import logging as log
+import os
+import sys
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lib.comparecache import CompareCache  # pylint: disable=wrong-import-position
+
+log.basicConfig(level=log.INFO)
+
+
+@click.group()
+def cli():
+    """Cache of comparison results of GCC buildbot."""
+    pass
+
+
+@cli.command()
+@click.option('--cache-dir', default='/home/gcc-buildbot/data/compare-cache')
+def stats(cache_dir: str) -> int:
+    """Prints the statistics of the cache."""
+    print(json.dumps(CompareCache(cache_dir).stats(), indent=2, sort_keys=True))
+    return 0
+
+
+@cli.command()
+@click.option('--cache-dir', default='/home/gcc-buildbot/data/compare-cache')
+@click.option('--max-size', type=int, default=256 * 1024 * 1024)
+def evict(cache_dir: str, max_size: int) -> int:
+    """Removes the least recently used entries over MAX_SIZE bytes."""
+    removed = CompareCache(cache_dir, max_size=max_size).evict()
+    log.info('Removed %d entries', removed)
+    return 0
+
+if __name__ == '__main__':
+    # pylint: disable=no-value-for-parameter,unexpected-keyword-arg
+    sys.exit(cli(standalone_mode=False))
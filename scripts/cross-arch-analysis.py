@@ -0,0 +1,119 @@
+#! /usr/bin/env python3
+
+# This script classifies the regressions of a revision across the
+# architectures tested by GCC buildbot (see lib/crossarch.py): generic
+# regressions, which show up on every architecture running the test,
+# are told apart from architecture-specific ones.
+#
+# The regressions of each architecture are the ones found by
+# scripts/regression-analysis.py (<lang>.regressions.json), i.e. against
+# a baseline completed with the last results of the drivers the
+# previous build did not run (see its complete_baseline).
+
+# Available command line:
+
+# Options:
+# --data-dir <path>
+# Directory of the data of the master; results are read from
+# <data-dir>/store and the report written to
+# <data-dir>/crossarch/<branch>/r<commit>.json.
+# --builder <string>
+# Builder of an architecture, may be repeated.
+# --branch <string>
+# Name of the branch to analyse regressions for.
+# --lang <name>
+# Name of language to analyse regressions for, may be repeated.
+# Arguments: COMMIT
+# The revision whose regressions are classified.
+
+import json
+import logging as log
+import os
+import sys
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lib.artifactstore import ArtifactStore, write_atomically  # pylint: disable=wrong-import-position
+from lib.crossarch import ResultMatrix  # pylint: disable=wrong-import-position
+
+log.basicConfig(level=log.INFO)
+
+
+def load_results(store: ArtifactStore, builder: str, branch: str, commit: int, lang: str):
+    """Returns the dictionary from test name to outcome of the summary
+    of lang of commit, or None if there is none."""
+    name = '{}.summary.json'.format(lang)
+    if not store.exists(builder, branch, commit, name):
+        return None
+
+    with store.open(builder, branch, commit, name) as f:
+        summary = json.loads(f.read().decode('utf-8'))
+    results = {}
+    for data in summary['exps'].values():
+        results.update(data['tests'])
+    return results
+
+
+def baseline_results(store: ArtifactStore, builder: str, branch: str, commit: int, lang: str,
+                     results: dict):
+    """Returns the results commit was compared with by the regression
+    analysis, as far as the tests of results are concerned: the same
+    results, but for the regressions, which are given their outcome
+    before.  Returns None if the regression analysis did not run."""
+    name = '{}.regressions.json'.format(lang)
+    if not store.exists(builder, branch, commit, name):
+        return None
+
+    with store.open(builder, branch, commit, name) as f:
+        regressions = json.loads(f.read().decode('utf-8'))['regressions']
+    before = dict(results)
+    for regression in regressions:
+        if regression['before'] is None:
+            before.pop(regression['test'], None)
+        else:
+            before[regression['test']] = regression['before']
+    return before
+
+
+@click.command()
+@click.option('--data-dir', default='/home/gcc-buildbot/data')
+@click.option('--builder', multiple=True)
+@click.option('--branch', default='trunk')
+@click.option('--lang', multiple=True)
+@click.argument('commit', type=int)
+def analyse(data_dir: str, builder: tuple, branch: str, lang: tuple, commit: int) -> int:
+    """Classifies the regressions of COMMIT across the builders."""
+    store = ArtifactStore(os.path.join(data_dir, 'store'))
+    report = {'revision': commit, 'branch': branch, 'langs': {}}
+
+    for l in lang:
+        before = {}
+        after = {}
+        for b in builder:
+            results = load_results(store, b, branch, commit, l)
+            baseline = baseline_results(store, b, branch, commit, l, results) if results else None
+            if baseline is None:
+                log.info('No %s regression analysis of r%d on %s', l, commit, b)
+                continue
+            after[b] = results
+            before[b] = baseline
+
+        if len(after) < 2:
+            log.info('Not enough architectures tested %s at r%d', l, commit)
+            continue
+
+        report['langs'][l] = ResultMatrix(before, after).classify()
+        log.info('%s: %d generic, %d arch-specific, %d partial regressions', l,
+                 len(report['langs'][l]['generic']),
+                 sum(len(tests) for tests in report['langs'][l]['specific'].values()),
+                 len(report['langs'][l]['partial']))
+
+    write_atomically(os.path.join(data_dir, 'crossarch', branch, 'r{}.json'.format(commit)),
+                     json.dumps(report, indent=2, sort_keys=True).encode('utf-8'))
+    print(json.dumps(report, indent=2, sort_keys=True))
+    return 0
+
+if __name__ == '__main__':
+    # pylint: disable=no-value-for-parameter,unexpected-keyword-arg
+    sys.exit(analyse(standalone_mode=False))
@@ -0,0 +1,65 @@
+#! /usr/bin/env python3
+
+# This script applies the retention policy of GCC buildbot (see
+# lib/retention.py) to the artifact store.  It is meant to be run
+# periodically, at idle I/O priority, by the DataRetentionService of
+# the master; each run does a bounded amount of work.
+
+# Available command line:
+
+# Options:
+# --store <path>
+# Path to the artifact store.
+# --keep-logs <int>
+# Number of most recent revisions per builder and branch whose .log
+# files are kept.
+# --archive-after <int>
+# Age, in days, after which revisions are packed into monthly archives.
+# --budget <int>
+# Approximate number of bytes read and written in one run.
+# --gc
+# Only reclaim the chunks no longer referenced by any manifest (see
+# ArtifactStore.gc) instead.  This reads every manifest of the store
+# and is not bounded by the budget, so it is run much less often.
+
+import logging as log
+import os
+import sys
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lib.artifactstore import ArtifactStore  # pylint: disable=wrong-import-position
+from lib.retention import RetentionPolicy  # pylint: disable=wrong-import-position
+
+log.basicConfig(level=log.INFO)
+
+
+@click.command()
+@click.option('--store', 'store_dir')
+@click.option('--keep-logs', type=int, default=50)
+@click.option('--archive-after', type=int, default=90)
+@click.option('--budget', type=int, default=64 * 1024 * 1024)
+@click.option('--gc', is_flag=True)
+def retention(store_dir: str, keep_logs: int, archive_after: int, budget: int, gc: bool) -> int:
+    """Applies the retention policy to the artifact store.
+
+    Returns 0 if all the work is done, or 2 if the budget was exhausted first.
+    """
+    if gc:
+        freed = ArtifactStore(store_dir).gc()
+        log.info('Freed %d bytes of unreferenced chunks', freed)
+        return 0
+
+    policy = RetentionPolicy(ArtifactStore(store_dir), keep_logs=keep_logs,
+                             archive_after=archive_after, budget=budget)
+    if policy.run():
+        log.info('Retention done (%d bytes)', policy.cost)
+        return 0
+
+    log.info('Retention budget exhausted (%d bytes), continuing next run', policy.cost)
+    return 2
+
+if __name__ == '__main__':
+    # pylint: disable=no-value-for-parameter,unexpected-keyword-arg
+    sys.exit(retention(standalone_mode=False))
@@ -0,0 +1,56 @@
+#! /usr/bin/env python3
+
+# This script asks GCC buildbot to fetch a DejaGnu .log file kept on
+# the worker which ran a build (see lib/logfetch.py).
+
+# Available command line:
+
+# Options:
+# --url <url>
+# URL of the buildbot master.
+# --builder <string>
+# Builder of the build whose log is wanted.
+# --branch <string>
+# Branch of the build whose log is wanted.
+# --lang <name>
+# Language of the log, e.g. gcc for gcc.log.
+# --test <name>
+# Only fetch the part of the log about this test, shown in the
+# LogFetch build.  Otherwise the whole log is stored in the artifact
+# store.
+# Arguments: COMMIT
+# Revision of the build whose log is wanted.
+
+import logging as log
+import os
+import sys
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lib.logfetch import LogFetchClient  # pylint: disable=wrong-import-position
+
+log.basicConfig(level=log.INFO)
+
+
+@click.command()
+@click.option('--url', default='http://localhost:5000')
+@click.option('--builder')
+@click.option('--branch', default='trunk')
+@click.option('--lang', default='gcc')
+@click.option('--test', default='')
+@click.argument('commit', type=int)
+def fetch(url: str, builder: str, branch: str, lang: str, test: str, commit: int) -> int:
+    """Requests the .log file of COMMIT from the worker which built it."""
+    try:
+        buildset = LogFetchClient(url).request(builder, branch, commit, lang, test)
+    except ValueError as e:
+        log.error('%s', e)
+        return 1
+
+    log.info('Requested, see buildset %s on %s', buildset, url)
+    return 0
+
+if __name__ == '__main__':
+    # pylint: disable=no-value-for-parameter,unexpected-keyword-arg
+    sys.exit(fetch(standalone_mode=False))
@@ -0,0 +1,84 @@
+#! /usr/bin/env python3
+
+# This script maintains and queries the trigram index over the DejaGnu
+# logs kept in the artifact store (see lib/logsearch.py).
+
+# Available commands:
+
+# index --db <path> --store <path> --builder <string> --branch <string> --name <name> COMMIT
+# Indexes the stored file NAME (e.g. g++.log) of COMMIT.
+# search --db <path> --store <path> [--regex] [--builder <string>]
+#        [--branch <string>] [--name <name>] [--limit <int>] PATTERN
+# Prints every log line containing PATTERN, a substring or, with
+# --regex, a regular expression.
+# prune --db <path> --store <path>
+# Forgets the files which are no longer in the artifact store.
+
+import logging as log
+import os
+import sys
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lib.artifactstore import ArtifactStore  # pylint: disable=wrong-import-position
+from lib.logsearch import LogIndex  # pylint: disable=wrong-import-position
+
+log.basicConfig(level=log.INFO)
+
+
+@click.group()
+def cli():
+    """Full-text search over GCC test logs."""
+    pass
+
+
+@cli.command()
+@click.option('--db')
+@click.option('--store', 'store_dir')
+@click.option('--builder')
+@click.option('--branch')
+@click.option('--name')
+@click.argument('commit', type=int)
+def index(db: str, store_dir: str, builder: str, branch: str, name: str, commit: int) -> int:
+    """Indexes the stored file NAME of COMMIT."""
+    logindex = LogIndex(db, ArtifactStore(store_dir))
+    new = logindex.index_file(builder, branch, commit, name)
+    logindex.close()
+    log.info('Indexed %s of r%d (%d new chunks)', name, commit, new)
+    return 0
+
+
+@cli.command()
+@click.option('--db')
+@click.option('--store', 'store_dir')
+@click.option('--regex', is_flag=True)
+@click.option('--builder')
+@click.option('--branch')
+@click.option('--name')
+@click.option('--limit', type=int, default=1000)
+@click.argument('pattern')
+def search(db: str, store_dir: str, regex: bool, builder: str, branch: str,
+           name: str, limit: int, pattern: str) -> int:
+    """Prints every log line matching PATTERN, with the file it comes from."""
+    logindex = LogIndex(db, ArtifactStore(store_dir))
+    for b, br, rev, n, line in logindex.search(pattern, regex=regex, builder=builder,
+                                               branch=branch, name=name, limit=limit):
+        print('{}/{}/r{}/{}: {}'.format(b, br, rev, n, line))
+    logindex.close()
+    return 0
+
+
+@cli.command()
+@click.option('--db')
+@click.option('--store', 'store_dir')
+def prune(db: str, store_dir: str) -> int:
+    """Forgets the files no longer in the artifact store."""
+    logindex = LogIndex(db, ArtifactStore(store_dir))
+    log.info('Forgot %d files', logindex.prune())
+    logindex.close()
+    return 0
+
+if __name__ == '__main__':
+    # pylint: disable=no-value-for-parameter,unexpected-keyword-arg
+    sys.exit(cli(standalone_mode=False))
@@ -0,0 +1,155 @@
+#! /usr/bin/env python3
+
+# This performance analysis file implements compile-time regression
+# analysis for GCC buildbot.
+#
+# The results of scripts/perf-bench.py for the current revision are
+# compared against a rolling baseline made of the previously measured
+# revisions of the same builder and branch.  The slowdowns found are
+# written next to the results, in r<commit>.slowdowns.json, for the
+# digest of the revision (see lib/gccdigest.py).
+
+# Available command line:
+
+# Options:
+# --data-dir <path>
+# Specifies which directory stores the data. This should take the shape of:
+# <data-dir>/<builder>/perf/<branch>/r<commit>.json
+# --builder <string>
+# This is the name of the builder used.
+# --branch <string>
+# Name of the branch to analyse regressions for.
+# --window <int>
+# Number of previous revisions used as the baseline.
+# --threshold <float>
+# Minimum Welch t statistic for a slowdown to be significant.
+# --min-slowdown <float>
+# Minimum relative slowdown to be reported (0.02 means 2%).
+# Arguments: COMMIT
+# The commit to analyse.
+
+import json
+import logging as log
+import math
+import os
+import re
+import statistics
+import sys
+
+import click
+
+log.basicConfig(level=log.DEBUG)
+
+# Metrics compared for every benchmark
+METRICS = ['wall', 'maxrss_kb']
+
+
+def find_baseline_revisions(path: str, commit: int, window: int) -> list:
+    """Returns the (at most) window revisions immediately preceding commit."""
+    filename_rexp = re.compile(r'r(\d+)\.json')
+    revisions = []
+
+    for f in os.listdir(path):
+        m = filename_rexp.match(f)
+        if not m:
+            continue
+
+        rev = int(m.group(1))
+        if rev < commit:
+            revisions.append(rev)
+
+    return sorted(revisions)[-window:]
+
+
+def load_results(path: str, rev: int) -> dict:
+    """Loads the benchmark results of revision rev."""
+    with open(os.path.join(path, 'r{}.json'.format(rev))) as f:
+        return json.load(f)['benchmarks']
+
+
+def welch_t(current: list, baseline: list) -> float:
+    """Computes Welch's t statistic of current against baseline.
+
+    A positive value means current is larger (i.e. slower) than baseline."""
+    varc = statistics.variance(current) if len(current) > 1 else 0.0
+    varb = statistics.variance(baseline) if len(baseline) > 1 else 0.0
+    stderr = math.sqrt(varc / len(current) + varb / len(baseline))
+    diff = statistics.mean(current) - statistics.mean(baseline)
+    if stderr == 0.0:
+        return math.inf if diff > 0 else 0.0
+    return diff / stderr
+
+
+def find_slowdowns(current: dict, baselines: list,
+                   threshold: float, min_slowdown: float) -> list:
+    """Returns a list of (benchmark, metric, baseline, current, t) slowdowns."""
+    slowdowns = []
+
+    for name, samples in sorted(current.items()):
+        for metric in METRICS:
+            # Pool the samples of every baseline revision measuring name
+            pooled = [v for b in baselines if name in b for v in b[name][metric]]
+            if len(pooled) < 2 or not samples[metric]:
+                continue
+
+            base = statistics.median(pooled)
+            cur = statistics.median(samples[metric])
+            if base <= 0 or (cur - base) / base < min_slowdown:
+                continue
+
+            t = welch_t(samples[metric], pooled)
+            if t >= threshold:
+                slowdowns.append((name, metric, base, cur, t))
+
+    return slowdowns
+
+
+@click.command()
+@click.option('--data-dir')
+@click.option('--builder')
+@click.option('--branch')
+@click.option('--window', type=int, default=10)
+@click.option('--threshold', type=float, default=3.0)
+@click.option('--min-slowdown', type=float, default=0.02)
+@click.argument('commit', type=int)
+def analyze(data_dir: str, builder: str, branch: str, window: int,
+            threshold: float, min_slowdown: float, commit: int) -> int:
+    """Performs compile-time analysis of the current commit against a rolling baseline.
+
+    Returns 0 if no significant slowdown was found or different than 0 otherwise.
+    """
+    log.info('GCC Compile-time Performance Analysis starting')
+
+    path = os.path.join(data_dir, builder, 'perf', branch)
+    current = load_results(path, commit)
+
+    revisions = find_baseline_revisions(path, commit, window)
+    if len(revisions) < 2:
+        log.info('Nothing to do, not enough revisions for a baseline')
+        return 0
+
+    baselines = [load_results(path, rev) for rev in revisions]
+    slowdowns = find_slowdowns(current, baselines, threshold, min_slowdown)
+
+    with open(os.path.join(path, 'r{}.slowdowns.json'.format(commit)), 'w') as f:
+        json.dump({'baseline': [revisions[0], revisions[-1]],
+                   'slowdowns': [{'benchmark': name, 'metric': metric, 'baseline': base,
+                                  'current': cur, 't': t}
+                                 for name, metric, base, cur, t in slowdowns]}, f)
+
+    print('Baseline: r{} to r{} ({} revisions)'.format(revisions[0], revisions[-1],
+                                                       len(revisions)))
+    if not slowdowns:
+        print('No significant compile-time slowdowns found')
+        return 0
+
+    print('Significant compile-time slowdowns:')
+    for name, metric, base, cur, t in slowdowns:
+        print('  {}: {} {:.3f} -> {:.3f} (+{:.1f}%, t = {:.1f})'
+              .format(name, metric, base, cur, 100.0 * (cur - base) / base, t))
+
+    return 1
+
+if __name__ == '__main__':
+    # pylint: disable=no-value-for-parameter,unexpected-keyword-arg
+    sys.exit(analyze(standalone_mode=False))
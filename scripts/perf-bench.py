@@ -0,0 +1,123 @@
+#! /usr/bin/env python3
+
+# This script runs on the worker, after GCC has been compiled, and
+# measures the compile-time performance of the freshly built compiler.
+#
+# Each benchmark of the corpus (see perf/corpus.json) is compiled
+# several times with -ftime-report, and the wall time, the peak RSS
+# and the per-phase timings reported by GCC are collected into a JSON
+# file which is then uploaded to the master.
+#
+# Only the standard library is used since workers do not necessarily
+# have the master's Python dependencies installed.
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+RESULTS_VERSION = 1
+
+# Matches lines of -ftime-report, either the old format:
+#  phase parsing   :   0.01 (50%) usr   0.01 (100%) sys   0.03 (10%) wall    1094 kB (10%) ggc
+# or the newer one:
+#  phase parsing   :   0.01 ( 50%)   0.01 (100%)   0.03 ( 10%)    1094 kB ( 10%)
+TIME_REPORT_RE = re.compile(r'^\s*(?P<name>[^:]+?)\s*:'
+                            r'\s*(?P<usr>\d+\.\d+)\s*(?:\(\s*\d+%\))?\s*(?:usr)?'
+                            r'\s*(?P<sys>\d+\.\d+)\s*(?:\(\s*\d+%\))?\s*(?:sys)?'
+                            r'\s*(?P<wall>\d+\.\d+)')
+
+
+def parse_time_report(text):
+    """Returns a dictionary from -ftime-report entry to wall time in seconds."""
+    phases = {}
+    for line in text.splitlines():
+        m = TIME_REPORT_RE.match(line)
+        if m:
+            phases[m.group('name')] = float(m.group('wall'))
+    return phases
+
+
+def run_once(command):
+    """Runs command once and returns (wall, maxrss_kb, phases).
+
+    The peak RSS is obtained from wait4, which accounts for the
+    driver and all the compiler processes it waited for (cc1, as...)."""
+    start = time.monotonic()
+    proc = subprocess.Popen(command,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE)
+    stderr = proc.stderr.read().decode('utf-8', 'replace')
+    _, status, rusage = os.wait4(proc.pid, 0)
+    wall = time.monotonic() - start
+    # Let Popen know the process has already been reaped
+    proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+
+    if proc.returncode != 0:
+        raise RuntimeError('{} failed:\n{}'.format(' '.join(command), stderr))
+
+    return wall, rusage.ru_maxrss, parse_time_report(stderr)
+
+
+def run_benchmark(xgcc, srcdir, bench, repeat):
+    """Compiles bench repeat times and returns its collected samples."""
+    bindir = os.path.dirname(xgcc)
+    command = [xgcc, '-B{}/'.format(bindir),
+               '-c', '-o', os.devnull, '-ftime-report'] \
+        + bench.get('flags', []) \
+        + [os.path.join(srcdir, bench['source'])]
+
+    samples = {'wall': [], 'maxrss_kb': [], 'phases': {}}
+    for _ in range(repeat):
+        wall, maxrss, phases = run_once(command)
+        samples['wall'].append(wall)
+        samples['maxrss_kb'].append(maxrss)
+        for phase, value in phases.items():
+            samples['phases'].setdefault(phase, []).append(value)
+
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GCC compile-time benchmarks')
+    parser.add_argument('--xgcc', required=True,
+                        help='Path to the freshly built gcc/xgcc')
+    parser.add_argument('--srcdir', required=True,
+                        help='Path to the GCC sources')
+    parser.add_argument('--corpus', required=True,
+                        help='Path to the benchmark corpus description')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of times each benchmark is compiled')
+    parser.add_argument('--revision', required=True)
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        corpus = json.load(f)
+
+    results = {'version': RESULTS_VERSION,
+               'revision': args.revision,
+               'repeat': args.repeat,
+               'benchmarks': {}}
+
+    failed = False
+    for bench in corpus['benchmarks']:
+        print('Running {}'.format(bench['name']))
+        sys.stdout.flush()
+        try:
+            results['benchmarks'][bench['name']] = \
+                run_benchmark(args.xgcc, args.srcdir, bench, args.repeat)
+        except (RuntimeError, OSError) as e:
+            print('Benchmark {} failed: {}'.format(bench['name'], e))
+            failed = True
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, sort_keys=True)
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
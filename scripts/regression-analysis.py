@@ -14,25 +14,52 @@
 # Specifies which directory stores the data. This should take the shape of:
 # <data-dir>/<builder>/<lang>/<branch>/r<commit>.sum.xz
 # <data-dir>/<builder>/<lang>/<branch>/r<commit>.log.xz
+# or, for results kept in the artifact store (see lib/artifactstore.py):
+# <data-dir>/store
 # --builder <string>
 # This is the name of the builder used.
 # --branch <string>
 # Name of the branch to analyse regressions for.
+# --cache-dir <path>
+# Cache of comparison results (see lib/comparecache.py), by default
+# <data-dir>/compare-cache.
+# --profile off|cprofile|tracemalloc
+# Profiles the analysis (see lib/profiling.py), the profile being
+# written to <data-dir>/profiles.
 # Arguments: COMMIT
 # The commit to compare with.
 
+import hashlib
+import json
 import logging as log
 import lzma
 import os
 import re
+import shutil
 import tempfile
 import sys
 
 import click
 import plumbum
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lib.artifactstore import ArtifactStore  # pylint: disable=wrong-import-position
+from lib.comparecache import CompareCache, comparison_key  # pylint: disable=wrong-import-position
+from lib.dejagnu import SumFile, find_regressions  # pylint: disable=wrong-import-position
+from lib.profiling import PROFILING_MODES, profiled  # pylint: disable=wrong-import-position
+from lib.telemetry import TELEMETRY_NAME, load_samples, resource_pressure  # pylint: disable=wrong-import-position
+
 log.basicConfig(level=log.DEBUG)
 
+# Number of revisions before the previous one searched for the last
+# build which ran a driver (see complete_baseline)
+DRIVER_LOOKBACK = 20
+
+
+def get_store(datadir: str) -> ArtifactStore:
+    """Returns the artifact store living in datadir."""
+    return ArtifactStore(os.path.join(datadir, 'store'))
+
 
 def find_previous_revision_file(datadir: str,
                                 builder: str,
@@ -48,12 +75,14 @@ def find_previous_revision_file(datadir: str,
     filename_rexp = re.compile(r'r(\d+)\.sum\.xz')
     previous = None
 
-    for f in os.listdir(path):
-        m = filename_rexp.match(f)
-        if not m:
-            continue
+    revisions = get_store(datadir).revisions(builder, branch, '{}.sum'.format(lang))
+    if os.path.isdir(path):
+        for f in os.listdir(path):
+            m = filename_rexp.match(f)
+            if m:
+                revisions.append(int(m.group(1)))
 
-        rev = int(m.group(1))
+    for rev in revisions:
         if rev < commit:
             if (previous and rev > previous) \
                or not previous:
@@ -62,40 +91,186 @@ def find_previous_revision_file(datadir: str,
     return previous
 
 
-@click.command()
-@click.option('--data-dir')
-@click.option('--builder')
-@click.option('--lang')
-@click.option('--branch')
-@click.argument('commit', type=int)
-def analyze(data_dir: str, builder: str, lang: str, branch: str, commit: int) -> int:
-    """Performs analysis of the current commit against the previous one.
+def open_sum_file(datadir: str, builder: str, lang: str, branch: str, commit: int):
+    """Opens, in binary mode, the .sum file of commit.
 
-    Returns 0 if no regressions were found or different than 0 otherwise.
-    """
-    log.info('GCC Regressions Analysis starting')
+    Loose r<commit>.sum.xz files are preferred to the artifact store."""
+    path = os.path.join(datadir, builder, lang, branch, 'r{}.sum.xz'.format(commit))
+    if os.path.exists(path):
+        return lzma.open(path)
 
-    previous = find_previous_revision_file(data_dir, builder, lang, branch, commit)
-    if not previous:
-        log.info('Nothing to do, first commit')
-        return 0
+    store = get_store(datadir)
+    name = '{}.sum'.format(lang)
+    assert store.exists(builder, branch, commit, name), \
+        'File does not exist for comparison: {} of r{}'.format(name, commit)
+    return store.open(builder, branch, commit, name)
+
+
+def load_summary(datadir: str, builder: str, lang: str, branch: str, commit: int):
+    """Returns the SumFile of the summary of commit uploaded by the worker,
+    or None if there is none."""
+    store = get_store(datadir)
+    name = '{}.summary.json'.format(lang)
+    if not store.exists(builder, branch, commit, name):
+        return None
+
+    with store.open(builder, branch, commit, name) as f:
+        summary = json.loads(f.read().decode('utf-8'))
+    try:
+        return SumFile.from_summary('r{}/{}'.format(commit, name), summary)
+    except ValueError as e:
+        log.warning('Ignoring summary: %s', e)
+        return None
+
+
+def content_hash(datadir: str, builder: str, lang: str, branch: str, commit: int, name: str) -> str:
+    """Returns a digest of the content of file name (e.g. 'gcc.sum') of commit."""
+    path = os.path.join(datadir, builder, lang, branch, 'r{}.sum.xz'.format(commit))
+    if name.endswith('.sum') and os.path.exists(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    return get_store(datadir).content_hash(builder, branch, commit, name)
+
+
+def lookback_revisions(datadir: str, builder: str, lang: str, branch: str, previous: int) -> list:
+    """Returns the revisions whose summaries complete_baseline may use,
+    the most recent first."""
+    revisions = sorted((rev for rev in get_store(datadir).revisions(builder, branch,
+                                                                    '{}.summary.json'.format(lang))
+                        if rev < previous), reverse=True)
+    return revisions[:DRIVER_LOOKBACK]
+
+
+def baseline_hash(datadir: str, builder: str, lang: str, branch: str, previous: int,
+                  name: str) -> str:
+    """Returns a digest of the content of file name of previous and of
+    the summaries complete_baseline may complete it with, computed from
+    the manifests only.  The comparison depends on all of them."""
+    digest = hashlib.sha256(content_hash(datadir, builder, lang, branch, previous, name)
+                            .encode('ascii'))
+    summary = '{}.summary.json'.format(lang)
+    for rev in lookback_revisions(datadir, builder, lang, branch, previous):
+        digest.update('\0r{}:{}'.format(rev, content_hash(datadir, builder, lang, branch, rev, summary))
+                      .encode('ascii'))
+    return digest.hexdigest()
+
+
+def complete_baseline(datadir: str, builder: str, lang: str, branch: str, previous: int,
+                      before: SumFile, after: SumFile) -> set:
+    """Completes before with the results of the drivers after ran but
+    before did not, from the last build which ran each of them in the
+    DRIVER_LOOKBACK revisions before previous.  Test profiles (see
+    lib/testprofiles.py) select different drivers in each build, and the
+    failures of a driver are only regressions if it did not fail the
+    last time it ran.
+
+    Returns the drivers without such a build, whose results cannot be
+    compared."""
+    missing = after.exps() - before.exps()
+    if not missing:
+        return missing
+
+    for rev in lookback_revisions(datadir, builder, lang, branch, previous):
+        older = load_summary(datadir, builder, lang, branch, rev)
+        if older is None:
+            continue
+        found = older.exps() & missing
+        for testname, outcome in older.testname_to_outcome.items():
+            exp = older.testname_to_exp.get(testname, '')
+            if exp in found:
+                before.add_result(testname, outcome, exp)
+        missing -= found
+        if not missing:
+            break
 
-    # Transform previous and commit into filenames
-    prevfile = os.path.join(data_dir, builder, lang, branch, 'r{}.sum.xz'.format(previous))
-    curfile = os.path.join(data_dir, builder, lang, branch, 'r{}.sum.xz'.format(commit))
+    if missing:
+        log.info('Not compared, no recent build ran them: %s', ', '.join(sorted(missing)))
+    return missing
 
-    assert os.path.exists(prevfile), \
-        'File does not exist for comparison: {}'.format(prevfile)
-    assert os.path.exists(curfile), \
-        'File does not exist for comparison: {}'.format(curfile)
 
+def list_regressions(before: SumFile, after: SumFile, skipped: set = frozenset()) -> list:
+    """Returns the regressions of after, as JSON serializable dictionaries,
+    ignoring the tests of the drivers in skipped."""
+    return [{'test': testname,
+             'exp': after.testname_to_exp.get(testname),
+             'before': outcome_before,
+             'after': outcome_after}
+            for testname, outcome_before, outcome_after in find_regressions(before, after)
+            if after.testname_to_exp.get(testname, '') not in skipped]
+
+
+def record_regressions(datadir: str, builder: str, lang: str, branch: str,
+                       commit: int, previous: int, regressions: list,
+                       pressure: dict = None) -> None:
+    """Stores the list of regressions of commit in the artifact store,
+    with the resource pressure the worker was under while testing.
+
+    The resulting <lang>.regressions.json is used by the bisection of
+    regressions and by the notifications."""
+    data = json.dumps({'version': 1,
+                       'previous': previous,
+                       'regressions': regressions,
+                       'resource_pressure': pressure}).encode('utf-8')
+    get_store(datadir).put(builder, branch, commit, '{}.regressions.json'.format(lang), [data])
+
+
+def load_resource_pressure(datadir: str, builder: str, branch: str, commit: int):
+    """Returns the resource pressure the worker was under while testing
+    commit (see lib/telemetry.py), or None."""
+    store = get_store(datadir)
+    if not store.exists(builder, branch, commit, TELEMETRY_NAME):
+        return None
+    with store.open(builder, branch, commit, TELEMETRY_NAME, mode='r') as f:
+        return resource_pressure(load_samples(f))
+
+
+def compare_summaries(before: SumFile, after: SumFile, skipped: set = frozenset()) -> dict:
+    """Compares the summaries made by the workers, without parsing the results."""
+    regressions = list_regressions(before, after, skipped)
+    output = ''.join('{}: {} -> {}\n'.format(r['test'], r['before'] or 'new', r['after'])
+                     for r in regressions)
+
+    # Like jv, also report the tests which went away or appeared, in the
+    # drivers run by both builds
+    ran = after.exps() - set(skipped)
+    gone = sorted(testname for testname in before.testname_to_outcome
+                  if testname not in after.testname_to_outcome
+                  and before.testname_to_exp.get(testname, '') in ran)
+    new = sorted(testname for testname in after.testname_to_outcome
+                 if testname not in before.testname_to_outcome
+                 and after.testname_to_exp.get(testname, '') in ran)
+    for title, testnames, sumfile in [('Tests that went away', gone, before),
+                                      ('Tests appeared', new, after)]:
+        if testnames:
+            output += '\n{}: {}\n'.format(title, len(testnames))
+            output += ''.join('{}: {}\n'.format(sumfile.testname_to_outcome[testname], testname)
+                              for testname in testnames)
+    # Like jv, fail on any of these issues, not only on regressions
+    return {'regressions': regressions,
+            'output': output,
+            'rc': 1 if regressions or gone or new else 0}
+
+
+def compare_with_jv(datadir: str, builder: str, lang: str, branch: str,
+                    commit: int, previous: int) -> dict:
+    """Compares the .sum files with jv.  Returns None if jv cannot be run."""
     # Unpack files
     prevtmp = tempfile.NamedTemporaryFile(suffix='.sum', delete=False)
-    with lzma.open(prevfile) as f:
-        prevtmp.write(f.read())
+    with open_sum_file(datadir, builder, lang, branch, previous) as f:
+        shutil.copyfileobj(f, prevtmp)
+    prevtmp.flush()
     curtmp = tempfile.NamedTemporaryFile(suffix='.sum', delete=False)
-    with lzma.open(curfile) as f:
-        curtmp.write(f.read())
+    with open_sum_file(datadir, builder, lang, branch, commit) as f:
+        shutil.copyfileobj(f, curtmp)
+    curtmp.flush()
+
+    before = SumFile(prevtmp.name)
+    after = SumFile(curtmp.name)
+    skipped = complete_baseline(datadir, builder, lang, branch, previous, before, after)
+    regressions = list_regressions(before, after, skipped)
 
     # OK, use jv to compare current commit to previous commit
     try:
@@ -103,13 +278,93 @@ def analyze(data_dir: str, builder: str, lang: str, branch: str, commit: int) ->
         rc, stdout, stderr = jv.run(('compare', prevtmp.name, curtmp.name), retcode=None)
     except plumbum.ProcessExecutionError:
         log.error('Cannot execute jv')
-        return 1
+        return None
 
     # TODO if rc is not zero we should probable do some investigation on why.
-    print(stdout)
     log.debug(stderr)
     log.debug('jv exited with %s', rc)
-    return rc
+    return {'regressions': regressions,
+            'output': stdout,
+            'rc': rc}
+
+
+def analyze_commit(data_dir: str, builder: str, lang: str, branch: str, cache_dir: str,
+                   commit: int) -> int:
+    """Compares commit with the previous revision tested."""
+    log.info('GCC Regressions Analysis starting')
+
+    previous = find_previous_revision_file(data_dir, builder, lang, branch, commit)
+    if not previous:
+        log.info('Nothing to do, first commit')
+        return 0
+
+    # Compare the summaries made by the workers if possible, it does not
+    # need to parse the results.  They are only loaded if the comparison
+    # is not in the cache.
+    store = get_store(data_dir)
+    summary = '{}.summary.json'.format(lang)
+    if all(store.exists(builder, branch, rev, summary) for rev in [previous, commit]):
+        method = 'summary'
+        name = summary
+    else:
+        method = 'jv'
+        name = '{}.sum'.format(lang)
+
+    cache = CompareCache(cache_dir or os.path.join(data_dir, 'compare-cache'))
+    key = comparison_key(method,
+                         baseline_hash(data_dir, builder, lang, branch, previous, name),
+                         content_hash(data_dir, builder, lang, branch, commit, name))
+    result = cache.get(key)
+    if result is not None:
+        log.info('Comparison found in the cache')
+    else:
+        before = after = None
+        if method == 'summary':
+            before = load_summary(data_dir, builder, lang, branch, previous)
+            after = load_summary(data_dir, builder, lang, branch, commit)
+            if not before or not after:
+                # Invalid summary, see load_summary
+                name = '{}.sum'.format(lang)
+                key = comparison_key('jv',
+                                     baseline_hash(data_dir, builder, lang, branch, previous, name),
+                                     content_hash(data_dir, builder, lang, branch, commit, name))
+        if before and after:
+            skipped = complete_baseline(data_dir, builder, lang, branch, previous, before, after)
+            result = compare_summaries(before, after, skipped)
+        else:
+            result = compare_with_jv(data_dir, builder, lang, branch, commit, previous)
+            if result is None:
+                return 1
+        cache.put(key, result)
+
+    pressure = load_resource_pressure(data_dir, builder, branch, commit)
+    record_regressions(data_dir, builder, lang, branch, commit, previous, result['regressions'],
+                       pressure)
+    log.info('%d regressions recorded', len(result['regressions']))
+    print(result['output'])
+    if pressure and result['regressions']:
+        print('Warning: the worker was short of resources while testing ({}), '
+              'these regressions may be caused by it.'.format(', '.join(pressure['reasons'])))
+    return result['rc']
+
+
+@click.command()
+@click.option('--data-dir')
+@click.option('--builder')
+@click.option('--lang')
+@click.option('--branch')
+@click.option('--cache-dir', default=None)
+@click.option('--profile', type=click.Choice(PROFILING_MODES), default='off')
+@click.argument('commit', type=int)
+def analyze(data_dir: str, builder: str, lang: str, branch: str, cache_dir: str, profile: str,
+            commit: int) -> int:
+    """Performs analysis of the current commit against the previous one.
+
+    Returns 0 if no regressions were found or different than 0 otherwise.
+    """
+    with profiled(profile, os.path.join(data_dir, 'profiles'),
+                  '{}-{}-{}-r{}'.format(builder, branch.replace('/', '_'), lang, commit)):
+        return analyze_commit(data_dir, builder, lang, branch, cache_dir, commit)
 
 if __name__ == '__main__':
     # pylint: disable=no-value-for-parameter,unexpected-keyword-arg
@@ -0,0 +1,153 @@
+#! /usr/bin/env python3
+
+# This script maintains and queries the per-test history index of GCC
+# buildbot (see lib/testhistory.py).
+
+# Available commands:
+
+# ingest --db <path> --store <path> --builder <string> --branch <string> --lang <name> COMMIT
+# Adds the outcomes of COMMIT, read from the artifact store (from the
+# <lang>.summary.json made by the worker, or else the <lang>.sum file),
+# to the index.
+# query --db <path> [--builder <string>] [--branch <string>] [--lang <name>] TESTNAME
+# Prints, as JSON, the outcome transitions of TESTNAME.
+# search --db <path> PATTERN
+# Prints the test names matching the SQL LIKE PATTERN.
+# serve --db <path> [--host <address>] [--port <int>]
+# Serves the above queries over HTTP:
+#   GET /history?test=<name>[&builder=<string>][&branch=<string>][&lang=<name>]
+#   GET /search?pattern=<pattern>
+
+import http.server
+import json
+import logging as log
+import os
+import socketserver
+import sys
+import urllib.parse
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lib.artifactstore import ArtifactStore  # pylint: disable=wrong-import-position
+from lib.dejagnu import SumFile  # pylint: disable=wrong-import-position
+from lib.testhistory import TestHistory  # pylint: disable=wrong-import-position
+
+log.basicConfig(level=log.INFO)
+
+
+@click.group()
+def cli():
+    """Per-test history of GCC test results."""
+    pass
+
+
+@cli.command()
+@click.option('--db')
+@click.option('--store', 'store_dir')
+@click.option('--builder')
+@click.option('--branch')
+@click.option('--lang')
+@click.argument('commit', type=int)
+def ingest(db: str, store_dir: str, builder: str, branch: str, lang: str, commit: int) -> int:
+    """Adds the results of COMMIT to the index."""
+    store = ArtifactStore(store_dir)
+    name = '{}.summary.json'.format(lang)
+    if store.exists(builder, branch, commit, name):
+        # Already parsed by the worker
+        with store.open(builder, branch, commit, name) as f:
+            sumfile = SumFile.from_summary(name, json.loads(f.read().decode('utf-8')))
+    else:
+        name = '{}.sum'.format(lang)
+        with store.open(builder, branch, commit, name, 'r') as f:
+            sumfile = SumFile(name, f)
+
+    history = TestHistory(db)
+    try:
+        count = history.ingest(builder, branch, lang, commit, sumfile.testname_to_outcome)
+    except ValueError as e:
+        log.error('Not indexed: %s', e)
+        return 1
+    finally:
+        history.close()
+
+    log.info('Indexed r%d of %s/%s/%s: %d transitions', commit, builder, branch, lang, count)
+    return 0
+
+
+@cli.command()
+@click.option('--db')
+@click.option('--builder')
+@click.option('--branch')
+@click.option('--lang')
+@click.argument('testname')
+def query(db: str, builder: str, branch: str, lang: str, testname: str) -> int:
+    """Prints the outcome transitions of TESTNAME."""
+    history = TestHistory(db)
+    print(json.dumps(history.query(testname, builder, branch, lang), indent=2))
+    history.close()
+    return 0
+
+
+@cli.command()
+@click.option('--db')
+@click.argument('pattern')
+def search(db: str, pattern: str) -> int:
+    """Prints the test names matching PATTERN."""
+    history = TestHistory(db)
+    for name in history.search(pattern):
+        print(name)
+    history.close()
+    return 0
+
+
+class HistoryServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+def make_handler(db: str):
+    """Returns the HTTP request handler class serving the index in db."""
+
+    class HistoryHandler(http.server.BaseHTTPRequestHandler):
+        def reply(self, code: int, data) -> None:
+            body = json.dumps(data).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            url = urllib.parse.urlparse(self.path)
+            args = {k: v[0] for k, v in urllib.parse.parse_qs(url.query).items()}
+
+            # SQLite connections cannot be shared between threads
+            history = TestHistory(db)
+            try:
+                if url.path == '/history' and 'test' in args:
+                    self.reply(200, history.query(args['test'], args.get('builder'),
+                                                  args.get('branch'), args.get('lang')))
+                elif url.path == '/search' and 'pattern' in args:
+                    self.reply(200, history.search(args['pattern']))
+                else:
+                    self.reply(404, {'error': 'unknown query'})
+            finally:
+                history.close()
+
+    return HistoryHandler
+
+
+@cli.command()
+@click.option('--db')
+@click.option('--host', default='localhost')
+@click.option('--port', type=int, default=8011)
+def serve(db: str, host: str, port: int) -> int:
+    """Serves the index over HTTP, as JSON."""
+    server = HistoryServer((host, port), make_handler(db))
+    log.info('Serving test history on %s:%d', host, port)
+    server.serve_forever()
+    return 0
+
+if __name__ == '__main__':
+    # pylint: disable=no-value-for-parameter,unexpected-keyword-arg
+    sys.exit(cli(standalone_mode=False))
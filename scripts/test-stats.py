@@ -0,0 +1,93 @@
+#! /usr/bin/env python3
+
+# This script maintains the per-driver test statistics used by the
+# time-budgeted test profiles of GCC buildbot (see lib/testprofiles.py).
+
+# Available commands:
+
+# update --stats-dir <path> --store <path> --builder <string> --branch <string> COMMIT
+# Adds the driver durations of COMMIT, read from
+# <stats-dir>/<builder>/r<commit>.times (as written by
+# scripts/runtest-wrapper), and the regressions it found, read from the
+# artifact store, to <stats-dir>/<builder>.json.
+# select --stats-dir <path> --builder <string> --profile <name> [--jobs <int>]
+# Prints the drivers the profile would run.
+
+import logging as log
+import json
+import os
+import sys
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lib.artifactstore import ArtifactStore  # pylint: disable=wrong-import-position
+from lib.testprofiles import PROFILES, TestStats, read_durations  # pylint: disable=wrong-import-position
+
+log.basicConfig(level=log.INFO)
+
+LANGS = ['gcc', 'g++', 'gfortran']
+
+
+def stats_path(stats_dir: str, builder: str) -> str:
+    return os.path.join(stats_dir, '{}.json'.format(builder))
+
+
+@click.group()
+def cli():
+    """Per-driver test statistics of GCC buildbot."""
+    pass
+
+
+@cli.command()
+@click.option('--stats-dir')
+@click.option('--store', 'store_dir')
+@click.option('--builder')
+@click.option('--branch')
+@click.argument('commit', type=int)
+def update(stats_dir: str, store_dir: str, builder: str, branch: str, commit: int) -> int:
+    """Adds the durations and regressions of COMMIT to the statistics."""
+    times = os.path.join(stats_dir, builder, 'r{}.times'.format(commit))
+    if not os.path.exists(times):
+        log.warning('No driver durations for r%d', commit)
+        return 0
+
+    store = ArtifactStore(store_dir)
+    regressions = {}
+    for lang in LANGS:
+        name = '{}.regressions.json'.format(lang)
+        if not store.exists(builder, branch, commit, name):
+            continue
+        with store.open(builder, branch, commit, name) as f:
+            for regression in json.loads(f.read().decode('utf-8'))['regressions']:
+                if regression['exp']:
+                    regressions[regression['exp']] = regressions.get(regression['exp'], 0) + 1
+
+    stats = TestStats(stats_path(stats_dir, builder))
+    durations = read_durations(times)
+    stats.update(durations, regressions)
+    stats.save()
+    os.remove(times)
+
+    log.info('Updated statistics of %d drivers (%d regressions) from r%d',
+             len(durations), sum(regressions.values()), commit)
+    return 0
+
+
+@cli.command()
+@click.option('--stats-dir')
+@click.option('--builder')
+@click.option('--profile', type=click.Choice(sorted(PROFILES)))
+@click.option('--jobs', type=int, default=1)
+def select(stats_dir: str, builder: str, profile: str, jobs: int) -> int:
+    """Prints the drivers run by PROFILE."""
+    exps = TestStats(stats_path(stats_dir, builder)).select(PROFILES[profile], jobs)
+    if exps is None:
+        print('(all)')
+    else:
+        print('\n'.join(exps))
+    return 0
+
+if __name__ == '__main__':
+    # pylint: disable=no-value-for-parameter,unexpected-keyword-arg
+    sys.exit(cli(standalone_mode=False))